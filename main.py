@@ -13,13 +13,16 @@ def resource_path(relative_path):
     return os.path.join(os.path.abspath("."), relative_path)
 
 def extract_resource_to_cwd(resource_name, target_name=None):
-    """将资源从 _MEIPASS 复制到当前目录"""
-    src = resource_path(resource_name)
+    """将资源从 _MEIPASS 复制到当前目录（仅首次启动，已有文件不覆盖）"""
     if target_name is None:
         target_name = os.path.basename(resource_name)
     dst = os.path.join(os.getcwd(), target_name)
-    if os.path.isfile(src) and not os.path.exists(dst):
-        shutil.copy(src, dst)
+    # 先查目标文件，非首次启动时直接返回，不再stat打包目录里的资源
+    if os.path.exists(dst):
+        return
+    src = resource_path(resource_name)
+    if os.path.isfile(src):
+        shutil.copy2(src, dst)
 
 
 if __name__ == "__main__":
@@ -1,16 +1,180 @@
-from collections import defaultdict
-from typing import Dict, List, Any, Optional
+import functools
+from operator import itemgetter
+from typing import Dict, List, Any, Optional, Tuple
 from .database import DatabaseManager
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
 
 class BOMCalculator:
     """BOM计算器，基于SQLite数据库进行配方计算"""
-    
+
     def __init__(self, db_manager: DatabaseManager = None):
         if db_manager is None:
             self.db_manager = DatabaseManager()
         else:
             self.db_manager = db_manager
+        # 缓存对应的数据库版本号，写提交后版本变化，下次计算自动整体失效
+        self._loaded_version = self.db_manager.data_version
+        # 单位需求缓存：同一半成品出现在多个配方下时不再重复展开子树
+        self._unit_cache: Dict[Tuple[str, int], Dict[int, float]] = {}
+        # 子树模板缓存（按单位数量构建，使用时深拷贝并按数量缩放）
+        self._full_tree_cache: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._named_tree_cache: Dict[Tuple[str, int], Optional[Dict[str, Any]]] = {}
+        # 内存配方图：首次计算时一次性加载全表，之后遍历只查字典
+        self._graph_loaded = False
+        self._base_names: Dict[int, str] = {}
+        self._product_info: Dict[int, Tuple[str, int]] = {}
+        self._material_info: Dict[int, Tuple[str, int]] = {}
+        self._reqs: Dict[Tuple[str, int], List[Tuple[str, int, float]]] = {}
+        # 物品类型->信息表的分发字典，在加载配方图时填充
+        self._info_maps: Dict[str, Dict[int, Tuple[str, int]]] = {}
+        # 配方节点的自底向上拓扑序，环检测通过后缓存
+        self._topo_order: List[Tuple[str, int]] = []
+        # (原材料 × 物品)系数矩阵，批量计算时一次矩阵乘法代替逐项遍历
+        self._matrix = None
+        self._matrix_cols: Dict[Tuple[str, int], int] = {}
+        self._matrix_base_ids: List[int] = []
+        # 未走预载路径的零散按ID查询也加一层LRU缓存
+        self._get_base_material_by_id = functools.lru_cache(maxsize=4096)(
+            self.db_manager.get_base_material_by_id)
+        self._get_material_by_id = functools.lru_cache(maxsize=4096)(
+            self.db_manager.get_material_by_id)
+        self._get_product_by_id = functools.lru_cache(maxsize=4096)(
+            self.db_manager.get_product_by_id)
+        # 界面反复用同一批名称查询，名称解析同样走LRU
+        self._get_material_by_name = functools.lru_cache(maxsize=1024)(
+            self.db_manager.get_material_by_name)
+        self._get_product_by_name = functools.lru_cache(maxsize=1024)(
+            self.db_manager.get_product_by_name)
+
+    def invalidate_cache(self):
+        """清空计算缓存和内存配方图，配方数据变更（如CSV导入）后必须调用"""
+        self._unit_cache.clear()
+        self._full_tree_cache.clear()
+        self._named_tree_cache.clear()
+        self._graph_loaded = False
+        self._base_names.clear()
+        self._product_info.clear()
+        self._material_info.clear()
+        self._reqs.clear()
+        self._topo_order = []
+        self._matrix = None
+        self._matrix_cols.clear()
+        self._matrix_base_ids = []
+        self._get_base_material_by_id.cache_clear()
+        self._get_material_by_id.cache_clear()
+        self._get_product_by_id.cache_clear()
+        self._get_material_by_name.cache_clear()
+        self._get_product_by_name.cache_clear()
+
+    def _ensure_fresh(self):
+        """数据库版本号变了说明有写提交，整套缓存失效后按需重建
+        失效跟着写入走，删除/编辑/导入等任何入口都不需要手动刷新计算器
+        """
+        version = self.db_manager.data_version
+        if self._loaded_version != version:
+            self.invalidate_cache()
+            self._loaded_version = version
+
+    def _ensure_loaded(self):
+        """一次性把原材料/半成品/成品/配方需求加载为内存字典，消除遍历中的逐条SELECT"""
+        if self._graph_loaded:
+            return
+        with self.db_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, name FROM base_materials')
+            self._base_names = {row[0]: row[1] for row in cursor.fetchall()}
+            cursor.execute('SELECT id, name, output_quantity FROM products')
+            self._product_info = {row[0]: (row[1], row[2] or 1) for row in cursor.fetchall()}
+            cursor.execute('SELECT id, name, output_quantity FROM materials')
+            self._material_info = {row[0]: (row[1], row[2] or 1) for row in cursor.fetchall()}
+            cursor.execute(
+                '''SELECT recipe_type, recipe_id, ingredient_type, ingredient_id, quantity
+                   FROM recipe_requirements ORDER BY recipe_type, recipe_id'''
+            )
+            reqs: Dict[Tuple[str, int], List[Tuple[str, int, float]]] = {}
+            for recipe_type, recipe_id, ing_type, ing_id, quantity in cursor.fetchall():
+                reqs.setdefault((recipe_type, recipe_id), []).append((ing_type, ing_id, quantity))
+            self._reqs = reqs
+        self._info_maps = {'product': self._product_info, 'material': self._material_info}
+        self._check_cycles()
+        self._graph_loaded = True
+
+    def _check_cycles(self):
+        """用迭代版Tarjan强连通分量检测配方循环依赖，顺带缓存自底向上的拓扑序"""
+        adj = {
+            key: [(t, i) for t, i, _ in ingredients]
+            for key, ingredients in self._reqs.items()
+        }
+        index: Dict[Tuple[str, int], int] = {}
+        lowlink: Dict[Tuple[str, int], int] = {}
+        on_stack = set()
+        scc_stack: List[Tuple[str, int]] = []
+        counter = 0
+        topo: List[Tuple[str, int]] = []
+        for root in adj:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = counter
+            counter += 1
+            scc_stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(adj[root]))]
+            while work:
+                node, children = work[-1]
+                advanced = False
+                for child in children:
+                    if child not in adj:
+                        # 没有配方的节点（原材料等）不可能在环上
+                        continue
+                    if child not in index:
+                        index[child] = lowlink[child] = counter
+                        counter += 1
+                        scc_stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(adj[child])))
+                        advanced = True
+                        break
+                    elif child in on_stack:
+                        if index[child] < lowlink[node]:
+                            lowlink[node] = index[child]
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if lowlink[node] < lowlink[parent]:
+                        lowlink[parent] = lowlink[node]
+                if lowlink[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = scc_stack.pop()
+                        on_stack.discard(member)
+                        scc.append(member)
+                        if member == node:
+                            break
+                    if len(scc) > 1 or node in adj[node]:
+                        names = []
+                        for item_type, item_id in scc:
+                            info_map = self._info_maps.get(item_type, {})
+                            info = info_map.get(item_id)
+                            names.append(info[0] if info else f'{item_type}#{item_id}')
+                        raise RuntimeError(f"配方存在循环依赖: {' -> '.join(names)}")
+                    topo.append(node)
+        # 子节点先于父节点出现，可直接用于自底向上传播
+        self._topo_order = topo
+
+    def _item_info(self, item_type: str, item_id: int) -> Optional[Tuple[str, int]]:
+        """从内存配方图中取物品的(名称, 产出数量)，不存在返回None"""
+        self._ensure_loaded()
+        # 字典分发代替逐类型if/elif分支
+        info_map = self._info_maps.get(item_type)
+        return info_map.get(item_id) if info_map is not None else None
     
     def calculate_requirements_by_name(self, item_type: str, item_name: str, quantity: float = 1) -> Dict[int, float]:
         """
@@ -20,11 +184,12 @@ class BOMCalculator:
         :param quantity: 需要制作的数量
         :return: 基础材料需求字典 {base_id: required_quantity}
         """
+        self._ensure_fresh()
         # 根据名称查找物品
         if item_type == 'product':
-            item = self.db_manager.get_product_by_name(item_name)
+            item = self._get_product_by_name(item_name)
         elif item_type == 'material':
-            item = self.db_manager.get_material_by_name(item_name)
+            item = self._get_material_by_name(item_name)
         else:
             raise ValueError(f"不支持的物品类型: {item_type}")
         
@@ -43,111 +208,195 @@ class BOMCalculator:
         :param include_all_levels: 是否包含所有层级的材料（默认为False，只返回基础材料）
         :return: 材料需求字典
         """
+        self._ensure_fresh()
         if include_all_levels:
             # 返回完整的材料树结构
             return self._calculate_full_tree(item_type, item_id, quantity)
         else:
-            # 保持原有逻辑，只返回基础材料
-            requirements = defaultdict(float)
-            self._calculate(item_type, item_id, quantity, requirements)
-            return dict(requirements)
-    
-    def _calculate_full_tree(self, item_type: str, item_id: int, quantity: float) -> Dict[str, Any]:
-        """递归计算完整的材料树，包括所有层级"""
-        result = {
-            'id': item_id,
-            'type': item_type,
-            'quantity': quantity,
-            'children': []
-        }
-        
-        if item_type == 'base':
-            return result
-        
-        # 获取物品信息和配方
-        if item_type == 'product':
-            item_info = self.db_manager.get_product_by_id(item_id)
-            if not item_info:
-                return result
-            output_qty = item_info.get('output_quantity', 1)
-            multiplier = quantity / output_qty
-        elif item_type == 'material':
-            item_info = self.db_manager.get_material_by_id(item_id)
-            if not item_info:
-                return result
-            output_qty = item_info.get('output_quantity', 1)
-            multiplier = quantity / output_qty
-        else:
-            return result
-        
-        # 获取配方需求
-        requirements = self.db_manager.get_recipe_requirements(item_type, item_id)
-        
-        # 递归计算每个成分
-        for req in requirements:
-            ing_type = req['ingredient_type']
-            ing_id = req['ingredient_id']
-            ing_qty = req['quantity'] * multiplier
-            
-            child = self._calculate_full_tree(ing_type, ing_id, ing_qty)
-            result['children'].append(child)
-        
-        return result
-    
-    def _calculate(self, item_type: str, item_id: int, quantity: float, requirements: Dict[int, float]):
-        """递归计算基础材料需求"""
-        if item_type == 'base':
-            requirements[item_id] += quantity
-            return
-        
-        # 获取物品信息
-        if item_type == 'product':
-            item_info = self.db_manager.get_product_by_id(item_id)
-            if not item_info:
-                return
-            output_qty = item_info.get('output_quantity', 1)
-            multiplier = quantity / output_qty
-        elif item_type == 'material':
-            item_info = self.db_manager.get_material_by_id(item_id)
+            # 基于单位需求缓存，按数量缩放
+            unit = self._unit_requirements(item_type, item_id)
+            return {base_id: per_unit * quantity for base_id, per_unit in unit.items()}
+
+    def _unit_requirements(self, item_type: str, item_id: int) -> Dict[int, float]:
+        """
+        计算制作1个物品所需的基础材料（已按产出数量折算）
+        结果缓存在_unit_cache中，重复出现的半成品子树只展开一次
+        使用显式栈做后序遍历，深层配方不会触发RecursionError
+        """
+        key = (item_type, item_id)
+        cached = self._unit_cache.get(key)
+        if cached is not None:
+            return cached
+
+        self._ensure_loaded()
+        stack = [key]
+        while stack:
+            node = stack[-1]
+            if node in self._unit_cache:
+                stack.pop()
+                continue
+            node_type, node_id = node
+            if node_type == 'base':
+                self._unit_cache[node] = {node_id: 1.0}
+                stack.pop()
+                continue
+            item_info = self._item_info(node_type, node_id)
+            ingredients = self._reqs.get(node, [])
             if not item_info:
-                return
-            output_qty = item_info.get('output_quantity', 1)
-            multiplier = quantity / output_qty
-        else:
-            return
-        
-        # 获取配方需求
-        recipe_requirements = self.db_manager.get_recipe_requirements(item_type, item_id)
-        
-        # 递归计算每个成分
-        for req in recipe_requirements:
-            ing_type = req['ingredient_type']
-            ing_id = req['ingredient_id']
-            ing_qty = req['quantity'] * multiplier
-            
-            self._calculate(ing_type, ing_id, ing_qty, requirements)
+                self._unit_cache[node] = {}
+                stack.pop()
+                continue
+            # 先把未计算的成分压栈，全部就绪后再汇总当前节点
+            pending = [(t, i) for t, i, _ in ingredients if (t, i) not in self._unit_cache]
+            if pending:
+                stack.extend(pending)
+                continue
+            output_qty = item_info[1]
+            # 热路径用普通dict累加，省掉defaultdict的__missing__开销
+            requirements: Dict[int, float] = {}
+            for ing_type, ing_id, req_qty in ingredients:
+                factor = req_qty / output_qty
+                for base_id, per_unit in self._unit_cache[(ing_type, ing_id)].items():
+                    requirements[base_id] = requirements.get(base_id, 0.0) + per_unit * factor
+            self._unit_cache[node] = requirements
+            stack.pop()
+
+        return self._unit_cache[key]
+
+    @staticmethod
+    def _scale_tree(node: Dict[str, Any], factor: float) -> Dict[str, Any]:
+        """按模板生成缩放后的新树，一趟遍历同时完成复制和数量缩放"""
+        scaled = dict(node)
+        scaled['quantity'] = node['quantity'] * factor
+        scaled['children'] = scaled_children = []
+        stack = [(node.get('children', []), scaled_children)]
+        while stack:
+            src_children, dst_children = stack.pop()
+            for child in src_children:
+                new_child = dict(child)
+                new_child['quantity'] = child['quantity'] * factor
+                new_child['children'] = new_list = []
+                dst_children.append(new_child)
+                stack.append((child.get('children', []), new_list))
+        return scaled
+
+    def _calculate_full_tree(self, item_type: str, item_id: int, quantity: float) -> Dict[str, Any]:
+        """计算完整的材料树，包括所有层级（子树模板缓存后按数量缩放）"""
+        key = (item_type, item_id)
+        template = self._full_tree_cache.get(key)
+        if template is not None:
+            return self._scale_tree(template, quantity)
+
+        self._ensure_loaded()
+        # 显式栈后序遍历，自底向上组装单位数量模板
+        stack = [key]
+        while stack:
+            node = stack[-1]
+            if node in self._full_tree_cache:
+                stack.pop()
+                continue
+            node_type, node_id = node
+            item_info = self._item_info(node_type, node_id)
+            ingredients = self._reqs.get(node, []) if item_info else []
+            pending = [(t, i) for t, i, _ in ingredients if (t, i) not in self._full_tree_cache]
+            if pending:
+                stack.extend(pending)
+                continue
+            template = {
+                'id': node_id,
+                'type': node_type,
+                'quantity': 1.0,
+                'children': []
+            }
+            if item_info:
+                multiplier = 1.0 / item_info[1]
+                for ing_type, ing_id, req_qty in ingredients:
+                    child = self._scale_tree(
+                        self._full_tree_cache[(ing_type, ing_id)], req_qty * multiplier
+                    )
+                    template['children'].append(child)
+            self._full_tree_cache[node] = template
+            stack.pop()
+
+        return self._scale_tree(self._full_tree_cache[key], quantity)
     
+    def build_coefficient_matrix(self):
+        """
+        预计算稠密(原材料 × 物品)系数矩阵C，C[b, col]表示生产1个物品需要的原材料b数量
+        沿缓存的拓扑序按列向量化传播，numpy不可用时返回None
+        """
+        if not NUMPY_AVAILABLE:
+            return None
+        self._ensure_fresh()
+        if self._matrix is not None:
+            return self._matrix
+        self._ensure_loaded()
+
+        cols: Dict[Tuple[str, int], int] = {}
+        for base_id in self._base_names:
+            cols[('base', base_id)] = len(cols)
+        for material_id in self._material_info:
+            cols[('material', material_id)] = len(cols)
+        for product_id in self._product_info:
+            cols[('product', product_id)] = len(cols)
+        base_ids = list(self._base_names)
+
+        matrix = np.zeros((len(base_ids), len(cols)), dtype=np.float64)
+        for row, base_id in enumerate(base_ids):
+            matrix[row, cols[('base', base_id)]] = 1.0
+        # 拓扑序保证子列先算完，每个配方列是子列的线性组合，整列一次numpy运算
+        for key in self._topo_order:
+            info = self._info_maps[key[0]].get(key[1])
+            if info is None:
+                continue
+            output_qty = info[1]
+            col = cols[key]
+            for ing_type, ing_id, req_qty in self._reqs.get(key, []):
+                child_col = cols.get((ing_type, ing_id))
+                if child_col is not None:
+                    matrix[:, col] += (req_qty / output_qty) * matrix[:, child_col]
+
+        self._matrix = matrix
+        self._matrix_cols = cols
+        self._matrix_base_ids = base_ids
+        return matrix
+
     def calculate_multiple_items(self, items: List[Dict[str, Any]]) -> Dict[int, float]:
         """
         计算多个物品的总需求
         :param items: 物品列表，格式: [{'type': 'product', 'id': 1, 'quantity': 3}, ...]
         :return: 基础材料总需求
         """
-        total_requirements = defaultdict(float)
-        
+        self._ensure_fresh()
+        matrix = self.build_coefficient_matrix()
+        if matrix is not None:
+            # 整个批量计算收敛为一次矩阵乘法
+            quantities = np.zeros(matrix.shape[1], dtype=np.float64)
+            known = True
+            for item in items:
+                col = self._matrix_cols.get((item['type'], item['id']))
+                if col is None:
+                    known = False
+                    break
+                quantities[col] += item['quantity']
+            if known:
+                totals = matrix @ quantities
+                return {
+                    base_id: total
+                    for base_id, total in zip(self._matrix_base_ids, totals)
+                    if total
+                }
+
+        total_requirements: Dict[int, float] = {}
+
+        # 直接从单位需求缓存累加进同一个字典，免去每个物品的中间结果字典
+        # 共享子树在整个清单范围内也只展开一次
         for item in items:
-            item_type = item['type']
-            item_id = item['id']
             quantity = item['quantity']
-            
-            # 计算单个物品需求
-            item_requirements = self.calculate_requirements_by_id(item_type, item_id, quantity)
-            
-            # 累加到总需求
-            for base_id, req_qty in item_requirements.items():
-                total_requirements[base_id] += req_qty
-        
-        return dict(total_requirements)
+            for base_id, per_unit in self._unit_requirements(item['type'], item['id']).items():
+                total_requirements[base_id] = total_requirements.get(base_id, 0.0) + per_unit * quantity
+
+        return total_requirements
     
     def get_recipe_tree(self, item_type: str, item_id: int, quantity: float = 1) -> Dict[str, Any]:
         """
@@ -157,82 +406,63 @@ class BOMCalculator:
         :param quantity: 数量
         :return: 配方树结构
         """
-        def build_tree_node(node_type: str, node_id: int, node_quantity: float) -> Dict[str, Any]:
-            # 获取物品信息
-            if node_type == 'base':
-                item_info = self.db_manager.get_base_material_by_id(node_id)
-                node = {
-                    'id': node_id,
-                    'type': node_type,
-                    'name': item_info['name'] if item_info else f'未知原材料({node_id})',
-                    'quantity': node_quantity,
-                    'children': []
-                }
-                return node
-            elif node_type == 'material':
-                item_info = self.db_manager.get_material_by_id(node_id)
+        self._ensure_fresh()
+        self._ensure_loaded()
+        key = (item_type, item_id)
+        if key not in self._named_tree_cache:
+            # 显式栈后序遍历，自底向上组装带名称的单位数量模板
+            stack = [key]
+            while stack:
+                node_key = stack[-1]
+                if node_key in self._named_tree_cache:
+                    stack.pop()
+                    continue
+                node_type, node_id = node_key
+                if node_type == 'base':
+                    name = self._base_names.get(node_id)
+                    self._named_tree_cache[node_key] = {
+                        'id': node_id,
+                        'type': node_type,
+                        'name': name if name else f'未知原材料({node_id})',
+                        'quantity': 1.0,
+                        'children': []
+                    }
+                    stack.pop()
+                    continue
+                item_info = self._item_info(node_type, node_id)
                 if not item_info:
-                    return None
-                
-                output_qty = item_info.get('output_quantity', 1)
-                multiplier = node_quantity / output_qty
-                
+                    # 物品不存在或类型不匹配，返回None
+                    self._named_tree_cache[node_key] = None
+                    stack.pop()
+                    continue
+                ingredients = self._reqs.get(node_key, [])
+                pending = [(t, i) for t, i, _ in ingredients if (t, i) not in self._named_tree_cache]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                name, output_qty = item_info
+                multiplier = 1.0 / output_qty
                 node = {
                     'id': node_id,
                     'type': node_type,
-                    'name': item_info['name'],
-                    'quantity': node_quantity,
+                    'name': name,
+                    'quantity': 1.0,
                     'output_quantity': output_qty,
                     'children': []
                 }
-                
-                # 获取配方需求
-                requirements = self.db_manager.get_recipe_requirements(node_type, node_id)
-                for req in requirements:
-                    child_type = req['ingredient_type']
-                    child_id = req['ingredient_id']
-                    child_qty = req['quantity'] * multiplier
-                    
-                    child_node = build_tree_node(child_type, child_id, child_qty)
-                    if child_node:
-                        node['children'].append(child_node)
-                
-                return node
-            
-            elif node_type == 'product':
-                item_info = self.db_manager.get_product_by_id(node_id)
-                if not item_info:
-                    return None
-                
-                output_qty = item_info.get('output_quantity', 1)
-                multiplier = node_quantity / output_qty
-                
-                node = {
-                    'id': node_id,
-                    'type': node_type,
-                    'name': item_info['name'],
-                    'quantity': node_quantity,
-                    'output_quantity': output_qty,
-                    'children': []
-                }
-                
-                # 获取配方需求
-                requirements = self.db_manager.get_recipe_requirements(node_type, node_id)
-                for req in requirements:
-                    child_type = req['ingredient_type']
-                    child_id = req['ingredient_id']
-                    child_qty = req['quantity'] * multiplier
-                    
-                    child_node = build_tree_node(child_type, child_id, child_qty)
-                    if child_node:
-                        node['children'].append(child_node)
-                
-                return node
-            
-            # 如果没有匹配的类型，返回None
+                for ing_type, ing_id, req_qty in ingredients:
+                    child_template = self._named_tree_cache[(ing_type, ing_id)]
+                    if child_template:
+                        node['children'].append(
+                            self._scale_tree(child_template, req_qty * multiplier)
+                        )
+                self._named_tree_cache[node_key] = node
+                stack.pop()
+
+        template = self._named_tree_cache[key]
+        if template is None:
             return None
-        
-        return build_tree_node(item_type, item_id, quantity)
+        return self._scale_tree(template, quantity)
     
     def format_requirements_for_display(self, requirements: Dict[int, float]) -> Dict[str, Any]:
         """
@@ -242,14 +472,19 @@ class BOMCalculator:
         """
         result = []
         total_cost = 0.0
-        
+
+        # 一次批量查询代替逐个ID查询
+        base_materials = {
+            row['id']: row
+            for row in self.db_manager.get_base_materials_by_ids(list(requirements.keys()))
+        }
         for base_id, quantity in requirements.items():
-            base_material = self.db_manager.get_base_material_by_id(base_id)
+            base_material = base_materials.get(base_id)
             if base_material:
                 cost = base_material.get('cost', 0)
                 item_total_cost = cost * quantity
                 total_cost += item_total_cost
-                
+
                 result.append({
                     'id': base_id,
                     'name': base_material['name'],
@@ -258,9 +493,9 @@ class BOMCalculator:
                     'cost': cost,
                     'total_cost': item_total_cost
                 })
-        
+
         # 按名称排序
-        result.sort(key=lambda x: x['name'])
+        result.sort(key=itemgetter('name'))
         
         return {
             'requirements': result,
@@ -274,12 +509,13 @@ class BOMCalculator:
         :param item_id: 物品ID
         :return: 物品信息
         """
+        self._ensure_fresh()
         if item_type == 'base':
-            return self.db_manager.get_base_material_by_id(item_id)
+            return self._get_base_material_by_id(item_id)
         elif item_type == 'material':
-            return self.db_manager.get_material_by_id(item_id)
+            return self._get_material_by_id(item_id)
         elif item_type == 'product':
-            return self.db_manager.get_product_by_id(item_id)
+            return self._get_product_by_id(item_id)
         else:
             return None
 
@@ -291,11 +527,12 @@ class BOMCalculator:
         :param quantity: 制作数量
         :return: 包含成本信息的字典
         """
+        self._ensure_fresh()
         # 获取物品信息
         if item_type == 'product':
-            item_info = self.db_manager.get_product_by_id(item_id)
+            item_info = self._get_product_by_id(item_id)
         elif item_type == 'material':
-            item_info = self.db_manager.get_material_by_id(item_id)
+            item_info = self._get_material_by_id(item_id)
         else:
             raise ValueError(f"不支持的物品类型: {item_type}")
         
@@ -8,13 +8,28 @@ CSV导入器模块
 import csv
 import os
 import re
-from typing import List, Dict, Any, Tuple
+import sys
+from typing import List, Dict, Any, Optional, Tuple
 from .database import DatabaseManager
 
+# 匹配“材料名(数量)”或“材料名”，模块加载时编译一次
+_REQUIREMENT_PATTERN = re.compile(r'([^\s()]+)(?:\((\d+)\))?')
+
+# 导入用的SQL文本固定，模块级定义配合同一cursor反复执行，命中sqlite3语句缓存
+_INSERT_MATERIAL_SQL = ('INSERT INTO materials (name, output_quantity, description, price) '
+                        'VALUES (?, 1, NULL, 0.0)')
+_INSERT_PRODUCT_SQL = ('INSERT INTO products (name, output_quantity, description, price) '
+                       'VALUES (?, 1, NULL, 0.0)')
+_INSERT_BASE_SQL = 'INSERT INTO base_materials (name, description, cost) VALUES (?, NULL, 0.0)'
+_INSERT_REQUIREMENT_SQL = ('INSERT INTO recipe_requirements '
+                           '(recipe_type, recipe_id, ingredient_type, ingredient_id, quantity) '
+                           'VALUES (?, ?, ?, ?, ?)')
+
 class CSVImporter:
     """适配实际CSV格式的导入器，只支持中文列头"""
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, calculator=None):
         self.db_manager = db_manager  # 由外部传入，已保证用根目录
+        self.calculator = calculator  # 可选，导入后用于清空计算缓存
 
     def import_from_csv(self, csv_file_path: str) -> Dict[str, Any]:
         """
@@ -37,84 +52,156 @@ class CSVImporter:
             result['message'] = f"文件不存在: {csv_file_path}"
             return result
         try:
-            with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
-                reader = csv.DictReader(file)
-                # 检查列头
+            with open(csv_file_path, 'r', encoding='utf-8-sig', newline='',
+                      buffering=1 << 20) as file:
+                # 列头固定，用csv.reader+列索引遍历，省去DictReader每行建字典的开销
+                reader = csv.reader(file)
+                header = next(reader, None)
                 required_cols = ['物品名称', '物品类型', '所需材料']
-                if not all(col in reader.fieldnames for col in required_cols):
+                # 集合判断子集，避免对列头的嵌套线性扫描
+                if header is None or not set(required_cols).issubset(header):
                     result['success'] = False
                     result['message'] = f"CSV文件缺少必需列: {required_cols}"
                     return result
+                col_index = {col: i for i, col in enumerate(header)}
+                name_i = col_index['物品名称']
+                type_i = col_index['物品类型']
+                reqs_i = col_index['所需材料']
+                min_cols = max(name_i, type_i, reqs_i) + 1
+                # 第一阶段：解析整个文件到内存，按类型分组
+                base_rows = []      # [名称]
+                material_rows = []  # [(行号, 名称, 成分列表)]
+                product_rows = []   # [(行号, 名称, 成分列表)]
+                # 类型字符串->目标列表的分发字典，循环内免去逐个字符串比较
+                rows_by_type = {'半成品': material_rows, '成品': product_rows}
                 for idx, row in enumerate(reader):
-                    name = row['物品名称'].strip()
-                    item_type = row['物品类型'].strip()
-                    requirements_str = row['所需材料'].strip()
+                    if len(row) < min_cols:
+                        continue
+                    name = row[name_i].strip()
+                    item_type = row[type_i].strip()
+                    requirements_str = row[reqs_i].strip()
                     if not name or not item_type:
                         continue
-                    try:
-                        if item_type == '半成品':
-                            # 检查是否已存在
-                            existing = self.db_manager.get_material_by_name(name)
-                            if existing:
-                                continue
-                            material_id = self.db_manager.add_material(name, 1, None)
-                            reqs = self._parse_requirements(requirements_str)
-                            for req_name, qty in reqs:
-                                # 检查是否有半成品标记[m]
-                                if req_name.startswith('[m]'):
-                                    # 去掉[m]标记，作为半成品处理
-                                    actual_name = req_name[3:]
-                                    mat = self.db_manager.get_material_by_name(actual_name)
-                                    if mat:
-                                        self.db_manager.add_recipe_requirement('material', material_id, 'material', mat['id'], qty)
-                                    else:
-                                        # 如果半成品不存在，跳过或报错
-                                        result['errors'].append(f"第{idx+2}行: 半成品'{actual_name}'不存在")
-                                else:
-                                    # 只允许原材料作为半成品成分
-                                    base = self.db_manager.get_base_material_by_name(req_name)
-                                    if not base:
-                                        # 自动添加原材料
-                                        base_id = self.db_manager.add_base_material(req_name, None)
-                                        base = self.db_manager.get_base_material_by_name(req_name)
-                                    self.db_manager.add_recipe_requirement('material', material_id, 'base', base['id'], qty)
-                            result['imported_counts']['materials'] += 1
-                        elif item_type == '成品':
-                            existing = self.db_manager.get_product_by_name(name)
-                            if existing:
+                    target_rows = rows_by_type.get(item_type)
+                    if target_rows is not None:
+                        target_rows.append((idx + 2, name, self._parse_requirements(requirements_str)))
+                    else:
+                        # 其它类型视为原材料
+                        base_rows.append(name)
+
+            # 大批量导入时值得先卸掉recipe_requirements的索引，插完整批再重建：
+            # 逐行维护两棵B树比最后一次性建树慢得多；小批量则不折腾
+            bulk_requirements = sum(len(reqs) for _, _, reqs in material_rows)
+            bulk_requirements += sum(len(reqs) for _, _, reqs in product_rows)
+            drop_indexes = bulk_requirements >= 500
+
+            # 第二阶段：单事务批量写入，避免逐行commit的fsync开销
+            # BEGIN IMMEDIATE立即拿写锁，出错时整体回滚不留半截数据
+            # 索引的DROP也在事务里，导入失败回滚时索引随之复原
+            with self.db_manager.transaction() as cursor:
+                index_ddl = []
+                if drop_indexes:
+                    # 从sqlite_master取回建索引语句，重建时照原样执行，不与schema定义重复
+                    cursor.execute(
+                        "SELECT name, sql FROM sqlite_master "
+                        "WHERE type = 'index' AND tbl_name = 'recipe_requirements' "
+                        "AND sql IS NOT NULL")
+                    index_ddl = cursor.fetchall()
+                    for index_name, _ in index_ddl:
+                        cursor.execute(f'DROP INDEX {index_name}')
+                # 一次性预载名称->ID映射，避免每行/每个成分都查一次数据库
+                cursor.execute('SELECT id, name FROM base_materials')
+                base_map = {name: rowid for rowid, name in cursor.fetchall()}
+                cursor.execute('SELECT id, name FROM materials')
+                mat_map = {name: rowid for rowid, name in cursor.fetchall()}
+                cursor.execute('SELECT id, name FROM products')
+                prod_map = {name: rowid for rowid, name in cursor.fetchall()}
+
+                # 批量插入新原材料（显式声明的行）
+                new_bases = [name for name in dict.fromkeys(base_rows) if name not in base_map]
+                # 批量插入新半成品/成品，已存在的跳过（与逐行导入一致）
+                new_materials = []
+                seen = set()
+                for line_no, name, reqs in material_rows:
+                    if name in mat_map or name in seen:
+                        continue
+                    seen.add(name)
+                    new_materials.append((line_no, name, reqs))
+                new_products = []
+                seen = set()
+                for line_no, name, reqs in product_rows:
+                    if name in prod_map or name in seen:
+                        continue
+                    seen.add(name)
+                    new_products.append((line_no, name, reqs))
+
+                # 写入前先跑一遍只读校验，诊断在开写之前全部给出
+                # 此时还没碰任何表，报错行为与写入过程解耦
+                future_mats = set(mat_map)
+                future_mats.update(name for _, name, _ in new_materials)
+                for rows in (new_materials, new_products):
+                    for line_no, _, reqs in rows:
+                        for req_name, _ in reqs:
+                            if req_name[:3] == '[m]' and req_name[3:] not in future_mats:
+                                result['errors'].append(f"第{line_no}行: 半成品'{req_name[3:]}'不存在")
+
+                # 同一条预编译INSERT循环执行，用lastrowid直接回填映射，省掉整表重查
+                for _, name, _ in new_materials:
+                    cursor.execute(_INSERT_MATERIAL_SQL, (name,))
+                    mat_map[name] = cursor.lastrowid
+                for _, name, _ in new_products:
+                    cursor.execute(_INSERT_PRODUCT_SQL, (name,))
+                    prod_map[name] = cursor.lastrowid
+
+                # 收集成分里引用但尚不存在的原材料名，连同显式行一并自动添加
+                # 列表保插入顺序，查重走伴随集合，避免对列表的逐项线性扫描
+                auto_bases = list(new_bases)
+                auto_base_set = set(auto_bases)
+                for _, _, reqs in new_materials:
+                    for req_name, _ in reqs:
+                        if (req_name[:3] != '[m]' and req_name not in base_map
+                                and req_name not in auto_base_set):
+                            auto_bases.append(req_name)
+                            auto_base_set.add(req_name)
+                for _, _, reqs in new_products:
+                    for req_name, _ in reqs:
+                        if (req_name[:3] != '[m]' and req_name not in mat_map
+                                and req_name not in base_map and req_name not in auto_base_set):
+                            auto_bases.append(req_name)
+                            auto_base_set.add(req_name)
+                for name in auto_bases:
+                    cursor.execute(_INSERT_BASE_SQL, (name,))
+                    base_map[name] = cursor.lastrowid
+
+                # 解析配方需求，统一一次executemany写入
+                requirement_rows = []
+                for recipe_type, rows, id_map in (
+                    ('material', new_materials, mat_map),
+                    ('product', new_products, prod_map),
+                ):
+                    # 成品成分先查半成品，再查原材料
+                    allow_material_fallback = recipe_type == 'product'
+                    for line_no, name, reqs in rows:
+                        recipe_id = id_map[name]
+                        for req_name, qty in reqs:
+                            resolved = self._resolve_ingredient(
+                                req_name, mat_map, base_map, allow_material_fallback)
+                            if resolved is None:
+                                # 缺失的半成品已在校验阶段报错，这里直接跳过
                                 continue
-                            product_id = self.db_manager.add_product(name, 1, None)
-                            reqs = self._parse_requirements(requirements_str)
-                            for req_name, qty in reqs:
-                                # 检查是否有半成品标记[m]
-                                if req_name.startswith('[m]'):
-                                    # 去掉[m]标记，作为半成品处理
-                                    actual_name = req_name[3:]
-                                    mat = self.db_manager.get_material_by_name(actual_name)
-                                    if mat:
-                                        self.db_manager.add_recipe_requirement('product', product_id, 'material', mat['id'], qty)
-                                    else:
-                                        # 如果半成品不存在，跳过或报错
-                                        result['errors'].append(f"第{idx+2}行: 半成品'{actual_name}'不存在")
-                                else:
-                                    # 先查半成品，再查原材料
-                                    mat = self.db_manager.get_material_by_name(req_name)
-                                    if mat:
-                                        self.db_manager.add_recipe_requirement('product', product_id, 'material', mat['id'], qty)
-                                    else:
-                                        base = self.db_manager.get_base_material_by_name(req_name)
-                                        if not base:
-                                            base_id = self.db_manager.add_base_material(req_name, None)
-                                            base = self.db_manager.get_base_material_by_name(req_name)
-                                        self.db_manager.add_recipe_requirement('product', product_id, 'base', base['id'], qty)
-                            result['imported_counts']['products'] += 1
-                        else:
-                            # 其它类型视为原材料
-                            if not self.db_manager.get_base_material_by_name(name):
-                                self.db_manager.add_base_material(name, None)
-                                result['imported_counts']['base_materials'] += 1
-                    except Exception as e:
-                        result['errors'].append(f"第{idx+2}行导入失败: {str(e)}")
+                            requirement_rows.append(
+                                (recipe_type, recipe_id, resolved[0], resolved[1], qty))
+                cursor.executemany(_INSERT_REQUIREMENT_SQL, requirement_rows)
+
+                for _, index_sql in index_ddl:
+                    cursor.execute(index_sql)
+                if index_ddl:
+                    # 重建后立刻刷新统计，查询计划器对新B树的估计不失真
+                    cursor.execute('ANALYZE recipe_requirements')
+
+            result['imported_counts']['base_materials'] = len(new_bases)
+            result['imported_counts']['materials'] = len(new_materials)
+            result['imported_counts']['products'] = len(new_products)
             if result['errors']:
                 result['success'] = False
                 result['message'] = f"导入完成，但有 {len(result['errors'])} 个错误"
@@ -124,8 +211,27 @@ class CSVImporter:
             result['success'] = False
             result['message'] = f"导入失败: {str(e)}"
             result['errors'].append(str(e))
+        # 导入会新增物品和配方，计算缓存必须失效
+        if self.calculator is not None:
+            self.calculator.invalidate_cache()
         return result
 
+    @staticmethod
+    def _resolve_ingredient(req_name: str, mat_map: Dict[str, int], base_map: Dict[str, int],
+                            allow_material_fallback: bool) -> Optional[Tuple[str, int]]:
+        """
+        把成分名解析为(成分类型, ID)
+        [m]前缀强制按半成品解析，不存在时返回None由调用方报错
+        """
+        if req_name[:3] == '[m]':
+            mat_id = mat_map.get(req_name[3:])
+            return ('material', mat_id) if mat_id is not None else None
+        if allow_material_fallback:
+            mat_id = mat_map.get(req_name)
+            if mat_id is not None:
+                return ('material', mat_id)
+        return ('base', base_map[req_name])
+
     def _parse_requirements(self, requirements_str: str) -> List[Tuple[str, float]]:
         """
         解析所需材料字符串，返回[(材料名, 数量)]
@@ -134,10 +240,18 @@ class CSVImporter:
         result = []
         if not requirements_str:
             return result
-        # 匹配“材料名(数量)”或“材料名”
-        pattern = re.compile(r'([^\s()]+)(?:\((\d+)\))?')
-        for match in pattern.finditer(requirements_str):
-            name = match.group(1).strip()
-            qty = int(match.group(2)) if match.group(2) else 1
-            result.append((name, qty))
+        # 常规写法直接按空白切分手工解析，不走正则引擎
+        # 成分名重复率极高，intern之后后续字典查找走指针相等的快路径
+        for token in requirements_str.split():
+            paren = token.find('(')
+            if paren < 0:
+                result.append((sys.intern(token), 1))
+                continue
+            qty_str = token[paren + 1:-1]
+            if paren > 0 and token.endswith(')') and qty_str.isdigit():
+                result.append((sys.intern(token[:paren]), int(qty_str)))
+            else:
+                # 畸形写法退回正则，保持与旧解析一致
+                for name, qty in _REQUIREMENT_PATTERN.findall(token):
+                    result.append((sys.intern(name), int(qty) if qty else 1))
         return result
\ No newline at end of file
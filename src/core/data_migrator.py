@@ -1,8 +1,18 @@
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any
+from loguru import logger
+
 from .database import DatabaseManager
 
+# 可选依赖：装了orjson就用C实现解码，没装退回标准库
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 
 class DataMigrator:
     """数据迁移工具，将JSON数据迁移到SQLite数据库"""
@@ -17,178 +27,228 @@ class DataMigrator:
             self.json_data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
         else:
             self.json_data_path = json_data_path
+
+        # 三个index.json的路径固定，构造时拼好，后续加载/验证直接复用
+        self._index_paths = {
+            key: os.path.join(self.json_data_path, key, 'index.json')
+            for key in ('base', 'materials', 'products')
+        }
     
+    def _read_json(self, path: str) -> List[Dict[str, Any]]:
+        """读取单个JSON文件，不存在时返回空列表"""
+        if not os.path.exists(path):
+            return []
+        with open(path, 'rb') as f:
+            return _json_loads(f.read())
+
     def load_json_data(self) -> Dict[str, List[Dict[str, Any]]]:
         """加载所有JSON数据"""
-        data = {}
-        
-        # 加载原材料数据
-        base_path = os.path.join(self.json_data_path, 'base', 'index.json')
-        if os.path.exists(base_path):
-            with open(base_path, 'r', encoding='utf-8') as f:
-                data['base'] = json.load(f)
-        else:
-            data['base'] = []
-        
-        # 加载半成品数据
-        materials_path = os.path.join(self.json_data_path, 'materials', 'index.json')
-        if os.path.exists(materials_path):
-            with open(materials_path, 'r', encoding='utf-8') as f:
-                data['materials'] = json.load(f)
-        else:
-            data['materials'] = []
-        
-        # 加载成品数据
-        products_path = os.path.join(self.json_data_path, 'products', 'index.json')
-        if os.path.exists(products_path):
-            with open(products_path, 'r', encoding='utf-8') as f:
-                data['products'] = json.load(f)
-        else:
-            data['products'] = []
-        
-        return data
+        # 原材料/半成品/成品三个文件互不依赖，线程池并行读取解码
+        keys = tuple(self._index_paths)
+        paths = list(self._index_paths.values())
+        with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+            return dict(zip(keys, executor.map(self._read_json, paths)))
     
-    def migrate_base_materials(self, base_data: List[Dict[str, Any]]) -> Dict[int, int]:
+    @staticmethod
+    def _load_name_ids(cursor, table: str, names: List[str]) -> Dict[str, int]:
+        """批量IN查询名称->ID映射，按500个一批避开SQLite参数上限"""
+        result = {}
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f'SELECT id, name FROM {table} WHERE name IN ({placeholders})',
+                chunk
+            )
+            for row_id, name in cursor.fetchall():
+                result[name] = row_id
+        return result
+
+    def migrate_base_materials(self, cursor, base_data: List[Dict[str, Any]]) -> Dict[int, int]:
         """迁移原材料数据，返回旧ID到新ID的映射"""
         id_mapping = {}
-        
-        print(f"开始迁移 {len(base_data)} 个原材料...")
-        
+
+        logger.info(f"开始迁移 {len(base_data)} 个原材料...")
+
+        # 只查本次迁移涉及的名称，循环内查字典
+        name_cache = self._load_name_ids(cursor, 'base_materials',
+                                         [item['name'] for item in base_data])
+
+        # 新名称去重后整批executemany写入，再一次性查回分配到的ID
+        new_names = [name for name in dict.fromkeys(item['name'] for item in base_data)
+                     if name not in name_cache]
+        if new_names:
+            cursor.executemany(
+                'INSERT INTO base_materials (name, description, cost) VALUES (?, NULL, 0)',
+                [(name,) for name in new_names]
+            )
+            name_cache.update(self._load_name_ids(cursor, 'base_materials', new_names))
+
+        inserted = set(new_names)
         for item in base_data:
             old_id = item['id']
             name = item['name']
-            
-            # 检查是否已存在
-            existing = self.db_manager.get_base_material_by_name(name)
-            if existing:
-                id_mapping[old_id] = existing['id']
-                print(f"原材料 '{name}' 已存在，跳过")
-                continue
-            
-            # 添加新的原材料
-            new_id = self.db_manager.add_base_material(name)
+            new_id = name_cache[name]
             id_mapping[old_id] = new_id
-            print(f"迁移原材料: {name} (旧ID: {old_id} -> 新ID: {new_id})")
-        
+            if name in inserted:
+                logger.debug(f"迁移原材料: {name} (旧ID: {old_id} -> 新ID: {new_id})")
+            else:
+                logger.debug(f"原材料 '{name}' 已存在，跳过")
+
         return id_mapping
-    
-    def migrate_materials(self, materials_data: List[Dict[str, Any]], 
+
+    def migrate_materials(self, cursor, materials_data: List[Dict[str, Any]],
                          base_id_mapping: Dict[int, int]) -> Dict[int, int]:
         """迁移半成品数据，返回旧ID到新ID的映射"""
         id_mapping = {}
-        
-        print(f"开始迁移 {len(materials_data)} 个半成品...")
-        
+
+        logger.info(f"开始迁移 {len(materials_data)} 个半成品...")
+
+        name_cache = self._load_name_ids(cursor, 'materials',
+                                         [item['name'] for item in materials_data])
+
+        new_items = []
+        seen = set(name_cache)
+        for item in materials_data:
+            if item['name'] not in seen:
+                seen.add(item['name'])
+                new_items.append(item)
+        if new_items:
+            cursor.executemany(
+                'INSERT INTO materials (name, output_quantity, description, price) VALUES (?, ?, NULL, 0.0)',
+                [(item['name'], item.get('output', 1)) for item in new_items]
+            )
+            name_cache.update(self._load_name_ids(cursor, 'materials',
+                                                  [item['name'] for item in new_items]))
+
+        inserted = {item['name'] for item in new_items}
         for item in materials_data:
             old_id = item['id']
             name = item['name']
-            output_quantity = item.get('output', 1)
-            
-            # 检查是否已存在
-            existing = self.db_manager.get_material_by_name(name)
-            if existing:
-                id_mapping[old_id] = existing['id']
-                print(f"半成品 '{name}' 已存在，跳过")
-                continue
-            
-            # 添加新的半成品
-            new_id = self.db_manager.add_material(name, output_quantity)
+            new_id = name_cache[name]
             id_mapping[old_id] = new_id
-            print(f"迁移半成品: {name} (旧ID: {old_id} -> 新ID: {new_id})")
-            
-            # 迁移配方需求
+            if name in inserted:
+                logger.debug(f"迁移半成品: {name} (旧ID: {old_id} -> 新ID: {new_id})")
+            else:
+                logger.debug(f"半成品 '{name}' 已存在，跳过")
+
+        # ID映射齐全后再迁移新半成品的配方需求
+        for item in new_items:
             if 'requirements' in item:
-                self._migrate_requirements('material', new_id, item['requirements'], 
-                                         base_id_mapping, id_mapping)
-        
+                self._migrate_requirements(cursor, 'material', name_cache[item['name']],
+                                           item['requirements'], base_id_mapping, id_mapping)
+
         return id_mapping
-    
-    def migrate_products(self, products_data: List[Dict[str, Any]], 
-                        base_id_mapping: Dict[int, int], 
+
+    def migrate_products(self, cursor, products_data: List[Dict[str, Any]],
+                        base_id_mapping: Dict[int, int],
                         materials_id_mapping: Dict[int, int]) -> Dict[int, int]:
         """迁移成品数据，返回旧ID到新ID的映射"""
         id_mapping = {}
-        
-        print(f"开始迁移 {len(products_data)} 个成品...")
-        
+
+        logger.info(f"开始迁移 {len(products_data)} 个成品...")
+
+        name_cache = self._load_name_ids(cursor, 'products',
+                                         [item['name'] for item in products_data])
+
+        new_items = []
+        seen = set(name_cache)
+        for item in products_data:
+            if item['name'] not in seen:
+                seen.add(item['name'])
+                new_items.append(item)
+        if new_items:
+            cursor.executemany(
+                'INSERT INTO products (name, output_quantity, description, price) VALUES (?, ?, NULL, 0.0)',
+                [(item['name'], item.get('output', 1)) for item in new_items]
+            )
+            name_cache.update(self._load_name_ids(cursor, 'products',
+                                                  [item['name'] for item in new_items]))
+
+        inserted = {item['name'] for item in new_items}
         for item in products_data:
             old_id = item['id']
             name = item['name']
-            output_quantity = item.get('output', 1)
-            
-            # 检查是否已存在
-            existing = self.db_manager.get_product_by_name(name)
-            if existing:
-                id_mapping[old_id] = existing['id']
-                print(f"成品 '{name}' 已存在，跳过")
-                continue
-            
-            # 添加新的成品
-            new_id = self.db_manager.add_product(name, output_quantity)
+            new_id = name_cache[name]
             id_mapping[old_id] = new_id
-            print(f"迁移成品: {name} (旧ID: {old_id} -> 新ID: {new_id})")
-            
-            # 迁移配方需求
+            if name in inserted:
+                logger.debug(f"迁移成品: {name} (旧ID: {old_id} -> 新ID: {new_id})")
+            else:
+                logger.debug(f"成品 '{name}' 已存在，跳过")
+
+        for item in new_items:
             if 'requirements' in item:
-                self._migrate_requirements('product', new_id, item['requirements'], 
-                                         base_id_mapping, materials_id_mapping)
-        
+                self._migrate_requirements(cursor, 'product', name_cache[item['name']],
+                                           item['requirements'], base_id_mapping, materials_id_mapping)
+
         return id_mapping
-    
-    def _migrate_requirements(self, recipe_type: str, recipe_id: int, 
-                            requirements: List[Dict[str, Any]], 
-                            base_id_mapping: Dict[int, int], 
+
+    def _migrate_requirements(self, cursor, recipe_type: str, recipe_id: int,
+                            requirements: List[Dict[str, Any]],
+                            base_id_mapping: Dict[int, int],
                             materials_id_mapping: Dict[int, int]):
         """迁移配方需求"""
+        rows = []
         for req in requirements:
             quantity = req['quantity']
-            
+
             if 'base_id' in req:
                 # 原材料需求
                 old_base_id = req['base_id']
                 if old_base_id in base_id_mapping:
-                    new_base_id = base_id_mapping[old_base_id]
-                    self.db_manager.add_recipe_requirement(
-                        recipe_type, recipe_id, 'base', new_base_id, quantity
-                    )
+                    rows.append((recipe_type, recipe_id, 'base',
+                                 base_id_mapping[old_base_id], quantity))
                 else:
-                    print(f"警告: 找不到原材料ID {old_base_id} 的映射")
-            
+                    logger.warning(f"警告: 找不到原材料ID {old_base_id} 的映射")
+
             elif 'material_id' in req:
                 # 半成品需求
                 old_material_id = req['material_id']
                 if old_material_id in materials_id_mapping:
-                    new_material_id = materials_id_mapping[old_material_id]
-                    self.db_manager.add_recipe_requirement(
-                        recipe_type, recipe_id, 'material', new_material_id, quantity
-                    )
+                    rows.append((recipe_type, recipe_id, 'material',
+                                 materials_id_mapping[old_material_id], quantity))
                 else:
-                    print(f"警告: 找不到半成品ID {old_material_id} 的映射")
-    
+                    logger.warning(f"警告: 找不到半成品ID {old_material_id} 的映射")
+
+        # 一个配方的需求攒成一批，executemany一次写入
+        if rows:
+            cursor.executemany(
+                'INSERT INTO recipe_requirements '
+                '(recipe_type, recipe_id, ingredient_type, ingredient_id, quantity) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
     def migrate_all(self) -> bool:
         """执行完整的数据迁移"""
         try:
-            print("开始数据迁移...")
-            
+            logger.info("开始数据迁移...")
+
             # 加载JSON数据
             json_data = self.load_json_data()
-            
-            # 按顺序迁移数据（原材料 -> 半成品 -> 成品）
-            base_id_mapping = self.migrate_base_materials(json_data['base'])
-            materials_id_mapping = self.migrate_materials(json_data['materials'], base_id_mapping)
-            products_id_mapping = self.migrate_products(json_data['products'], 
-                                                       base_id_mapping, materials_id_mapping)
-            
-            print("数据迁移完成！")
-            print(f"迁移统计:")
-            print(f"  原材料: {len(base_id_mapping)} 个")
-            print(f"  半成品: {len(materials_id_mapping)} 个")
-            print(f"  成品: {len(products_id_mapping)} 个")
+
+            # 整个迁移放在同一个连接、同一个事务里，只在结尾commit一次
+            # 避免逐条插入时每次都触发fsync
+            with self.db_manager.get_connection() as conn:
+                cursor = conn.cursor()
+                # 按顺序迁移数据（原材料 -> 半成品 -> 成品）
+                base_id_mapping = self.migrate_base_materials(cursor, json_data['base'])
+                materials_id_mapping = self.migrate_materials(cursor, json_data['materials'],
+                                                              base_id_mapping)
+                products_id_mapping = self.migrate_products(cursor, json_data['products'],
+                                                            base_id_mapping, materials_id_mapping)
+                conn.commit()
+
+            logger.info("数据迁移完成！")
+            logger.info("迁移统计:")
+            logger.info(f"  原材料: {len(base_id_mapping)} 个")
+            logger.info(f"  半成品: {len(materials_id_mapping)} 个")
+            logger.info(f"  成品: {len(products_id_mapping)} 个")
             
             return True
             
         except Exception as e:
-            print(f"数据迁移失败: {e}")
+            logger.error(f"数据迁移失败: {e}")
             return False
     
     def backup_json_data(self, backup_path: str = None):
@@ -197,18 +257,29 @@ class DataMigrator:
             backup_path = os.path.join(os.path.dirname(self.json_data_path), 'data_backup')
         
         os.makedirs(backup_path, exist_ok=True)
-        
-        # 复制所有JSON文件
+
+        # 同一文件系统上用硬链接做零拷贝快照，失败（跨盘/不支持）退回复制
         import shutil
-        
+
         for subdir in ['base', 'materials', 'products']:
             src_dir = os.path.join(self.json_data_path, subdir)
             dst_dir = os.path.join(backup_path, subdir)
-            
-            if os.path.exists(src_dir):
-                shutil.copytree(src_dir, dst_dir, dirs_exist_ok=True)
-        
-        print(f"JSON数据已备份到: {backup_path}")
+
+            if not os.path.exists(src_dir):
+                continue
+            os.makedirs(dst_dir, exist_ok=True)
+            for entry in os.scandir(src_dir):
+                if not entry.is_file():
+                    continue
+                dst_file = os.path.join(dst_dir, entry.name)
+                if os.path.exists(dst_file):
+                    os.remove(dst_file)
+                try:
+                    os.link(entry.path, dst_file)
+                except OSError:
+                    shutil.copy2(entry.path, dst_file)
+
+        logger.info(f"JSON数据已备份到: {backup_path}")
     
     def verify_migration(self) -> bool:
         """验证迁移结果"""
@@ -224,23 +295,23 @@ class DataMigrator:
             json_materials_count = len(json_data['materials'])
             json_products_count = len(json_data['products'])
             
-            print("迁移验证结果:")
-            print(f"原材料: JSON({json_base_count}) -> DB({db_base_count})")
-            print(f"半成品: JSON({json_materials_count}) -> DB({db_materials_count})")
-            print(f"成品: JSON({json_products_count}) -> DB({db_products_count})")
+            logger.info("迁移验证结果:")
+            logger.info(f"原材料: JSON({json_base_count}) -> DB({db_base_count})")
+            logger.info(f"半成品: JSON({json_materials_count}) -> DB({db_materials_count})")
+            logger.info(f"成品: JSON({json_products_count}) -> DB({db_products_count})")
             
             # 检查是否有数据丢失
             if (db_base_count >= json_base_count and 
                 db_materials_count >= json_materials_count and 
                 db_products_count >= json_products_count):
-                print("✓ 迁移验证通过")
+                logger.info("✓ 迁移验证通过")
                 return True
             else:
-                print("✗ 迁移验证失败，可能有数据丢失")
+                logger.info("✗ 迁移验证失败，可能有数据丢失")
                 return False
                 
         except Exception as e:
-            print(f"验证失败: {e}")
+            logger.error(f"验证失败: {e}")
             return False
 
 
@@ -256,4 +327,4 @@ if __name__ == "__main__":
         # 验证迁移结果
         migrator.verify_migration()
     else:
-        print("迁移失败，请检查错误信息")
\ No newline at end of file
+        logger.error("迁移失败，请检查错误信息")
\ No newline at end of file
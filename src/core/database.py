@@ -1,9 +1,227 @@
+import atexit
 import sys
 import os
 import sqlite3
+import threading
+import weakref
 from typing import List, Dict, Any, Optional
 from contextlib import contextmanager
 
+# 进程级只注册一个退出钩子，经弱引用集合找到届时仍存活的实例
+# 直接atexit.register绑定方法会强引用每个实例，被换下的管理器
+# 连同其打开的连接会被钉在atexit表里到进程结束，管理器一多就泄漏连接
+_live_managers: 'weakref.WeakSet[DatabaseManager]' = weakref.WeakSet()
+
+
+def _optimize_managers_on_exit():
+    for manager in list(_live_managers):
+        manager._optimize_on_exit()
+
+
+atexit.register(_optimize_managers_on_exit)
+
+# 每条连接的调优PRAGMA，executescript一次执行完
+# WAL下NORMAL只在checkpoint时fsync；temp_store/cache_size/mmap_size降低临时表和页缓存的I/O
+# mmap让各连接的读路径共享同一份OS页缓存，不必开shared-cache（后者会引入表级锁）
+# busy_timeout让并发写线程排队等锁而不是立刻报database is locked
+_CONNECTION_PRAGMAS = '''
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+    PRAGMA busy_timeout=5000;
+'''
+
+# 全部建表/建索引DDL，executescript单事务一次执行
+_SCHEMA_DDL = '''
+    -- 原材料表
+    CREATE TABLE IF NOT EXISTS base_materials (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        description TEXT,
+        cost REAL DEFAULT 0.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- 半成品表
+    CREATE TABLE IF NOT EXISTS materials (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        output_quantity INTEGER DEFAULT 1,
+        description TEXT,
+        price REAL DEFAULT 0.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- 成品表
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        output_quantity INTEGER DEFAULT 1,
+        description TEXT,
+        price REAL DEFAULT 0.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- 配方需求表
+    CREATE TABLE IF NOT EXISTS recipe_requirements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipe_type TEXT NOT NULL CHECK(recipe_type IN ('material', 'product')),
+        recipe_id INTEGER NOT NULL,
+        ingredient_type TEXT NOT NULL CHECK(ingredient_type IN ('base', 'material')),
+        ingredient_id INTEGER NOT NULL,
+        quantity REAL NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- 设置表
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- 覆盖索引：配方展开查询的全部列都在索引里，免去回表取行
+    DROP INDEX IF EXISTS idx_recipe_requirements_recipe;
+    CREATE INDEX IF NOT EXISTS idx_recipe_requirements_recipe_cov
+    ON recipe_requirements(recipe_type, recipe_id, ingredient_type, ingredient_id, quantity);
+
+    CREATE INDEX IF NOT EXISTS idx_recipe_requirements_ingredient
+    ON recipe_requirements(ingredient_type, ingredient_id);
+
+    -- 配方单位成本视图：递归CTE把配方展开到原材料并按cost汇总
+    -- 整个计算在SQLite引擎内一趟完成，读到的永远和当前数据一致
+    -- depth上限防御循环配方（正常数据远小于32层）
+    CREATE VIEW IF NOT EXISTS recipe_base_costs AS
+    WITH RECURSIVE expand(rt, rid, ing_type, ing_id, qty, depth) AS (
+        SELECT recipe_type, recipe_id, ingredient_type, ingredient_id, quantity, 0
+        FROM recipe_requirements
+        UNION ALL
+        SELECT e.rt, e.rid, rr.ingredient_type, rr.ingredient_id,
+               e.qty * rr.quantity / COALESCE(m.output_quantity, 1), e.depth + 1
+        FROM expand e
+        JOIN materials m ON e.ing_type = 'material' AND m.id = e.ing_id
+        JOIN recipe_requirements rr
+            ON rr.recipe_type = 'material' AND rr.recipe_id = e.ing_id
+        WHERE e.depth < 32
+    )
+    SELECT e.rt AS recipe_type, e.rid AS recipe_id, SUM(e.qty * b.cost) AS unit_cost
+    FROM expand e
+    JOIN base_materials b ON e.ing_type = 'base' AND b.id = e.ing_id
+    GROUP BY e.rt, e.rid;
+
+    -- recipe_id是多态引用（materials/products共用一张需求表），没法声明真外键
+    -- 用触发器模拟ON DELETE CASCADE，删除配方时一并清掉其需求行
+    CREATE TRIGGER IF NOT EXISTS materials_reqs_cascade AFTER DELETE ON materials BEGIN
+        DELETE FROM recipe_requirements
+        WHERE recipe_type = 'material' AND recipe_id = old.id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS products_reqs_cascade AFTER DELETE ON products BEGIN
+        DELETE FROM recipe_requirements
+        WHERE recipe_type = 'product' AND recipe_id = old.id;
+    END;
+
+    -- 名称搜索用的FTS5索引（external content，数据仍以原表为准）
+    -- trigram分词对中文子串匹配有效，且LIKE查询可直接走倒排索引
+    CREATE VIRTUAL TABLE IF NOT EXISTS base_materials_fts USING fts5(
+        name, content='base_materials', content_rowid='id', tokenize='trigram'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS materials_fts USING fts5(
+        name, content='materials', content_rowid='id', tokenize='trigram'
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, content='products', content_rowid='id', tokenize='trigram'
+    );
+
+    -- 触发器保持FTS与原表同步
+    CREATE TRIGGER IF NOT EXISTS base_materials_fts_ai AFTER INSERT ON base_materials BEGIN
+        INSERT INTO base_materials_fts(rowid, name) VALUES (new.id, new.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS base_materials_fts_ad AFTER DELETE ON base_materials BEGIN
+        INSERT INTO base_materials_fts(base_materials_fts, rowid, name)
+        VALUES ('delete', old.id, old.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS base_materials_fts_au AFTER UPDATE OF name ON base_materials BEGIN
+        INSERT INTO base_materials_fts(base_materials_fts, rowid, name)
+        VALUES ('delete', old.id, old.name);
+        INSERT INTO base_materials_fts(rowid, name) VALUES (new.id, new.name);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS materials_fts_ai AFTER INSERT ON materials BEGIN
+        INSERT INTO materials_fts(rowid, name) VALUES (new.id, new.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS materials_fts_ad AFTER DELETE ON materials BEGIN
+        INSERT INTO materials_fts(materials_fts, rowid, name)
+        VALUES ('delete', old.id, old.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS materials_fts_au AFTER UPDATE OF name ON materials BEGIN
+        INSERT INTO materials_fts(materials_fts, rowid, name)
+        VALUES ('delete', old.id, old.name);
+        INSERT INTO materials_fts(rowid, name) VALUES (new.id, new.name);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name)
+        VALUES ('delete', old.id, old.name);
+    END;
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name)
+        VALUES ('delete', old.id, old.name);
+        INSERT INTO products_fts(rowid, name) VALUES (new.id, new.name);
+    END;
+'''
+
+# 热路径SQL固定成模块常量：语句缓存按SQL文本取预编译结果，常量保证每次都是同一字符串对象
+_SQL_GET_BASE_BY_ID = 'SELECT * FROM base_materials WHERE id = ?'
+_SQL_GET_BASE_BY_NAME = 'SELECT * FROM base_materials WHERE name = ?'
+_SQL_GET_MATERIAL_BY_ID = 'SELECT * FROM materials WHERE id = ?'
+_SQL_GET_MATERIAL_BY_NAME = 'SELECT * FROM materials WHERE name = ?'
+_SQL_GET_PRODUCT_BY_ID = 'SELECT * FROM products WHERE id = ?'
+_SQL_GET_PRODUCT_BY_NAME = 'SELECT * FROM products WHERE name = ?'
+_SQL_LIST_BASE = 'SELECT * FROM base_materials ORDER BY name'
+_SQL_LIST_BASE_BRIEF = 'SELECT id, name, cost FROM base_materials ORDER BY name'
+_SQL_LIST_MATERIALS = 'SELECT * FROM materials ORDER BY name'
+_SQL_LIST_MATERIALS_BRIEF = ('SELECT id, name, output_quantity, price '
+                             'FROM materials ORDER BY name')
+_SQL_LIST_PRODUCTS = 'SELECT * FROM products ORDER BY name'
+_SQL_LIST_PRODUCTS_BRIEF = ('SELECT id, name, output_quantity, price '
+                            'FROM products ORDER BY name')
+# 不取created_at列，使查询完全被覆盖索引满足（id是rowid别名，索引自带）
+_SQL_GET_RECIPE_REQS = ('SELECT id, recipe_type, recipe_id, ingredient_type, ingredient_id, '
+                        'quantity FROM recipe_requirements '
+                        'WHERE recipe_type = ? AND recipe_id = ?')
+_SQL_GET_ALL_RECIPE_REQS = ('SELECT recipe_id, ingredient_type, ingredient_id, quantity '
+                            'FROM recipe_requirements '
+                            'WHERE recipe_type = ? ORDER BY recipe_id')
+_SQL_INSERT_REQUIREMENT = ('INSERT INTO recipe_requirements '
+                           '(recipe_type, recipe_id, ingredient_type, ingredient_id, quantity) '
+                           'VALUES (?, ?, ?, ?, ?)')
+# 搜索两条路径的语句模板：表名编译期格式化一次，运行期只带LIKE参数
+_SQL_SEARCH_FTS = {
+    table: (f'SELECT x.* FROM {table} x '
+            f'JOIN {table}_fts f ON x.id = f.rowid '
+            f'WHERE f.name LIKE ? ORDER BY x.name')
+    for table in ('base_materials', 'materials', 'products')
+}
+_SQL_SEARCH_LIKE = {
+    table: f'SELECT * FROM {table} WHERE name LIKE ? ORDER BY name'
+    for table in ('base_materials', 'materials', 'products')
+}
+
+
+def _dict_rows(cursor) -> List[Dict[str, Any]]:
+    """把查询结果整批转成dict列表
+    关掉本游标的Row工厂，直接从元组zip出dict，省去每行先建sqlite3.Row再转dict的双重开销
+    """
+    cursor.row_factory = None
+    cols = [d[0] for d in cursor.description]
+    return [dict(zip(cols, row)) for row in cursor.fetchall()]
+
+
 class DatabaseManager:
     """数据库管理类，负责SQLite数据库的创建、连接和操作"""
     
@@ -12,316 +230,420 @@ class DatabaseManager:
             self.db_path = os.path.join(os.getcwd(), 'ffixv_recipes.db')
         else:
             self.db_path = db_path
+        # 支持纯内存库（测试/临时计算用）：':memory:'改写成共享缓存URI，
+        # 否则每个线程的连接各自开一个空库；多个实例传同一URI时共享同一个内存库
+        self._uri = self.db_path.startswith('file:')
+        if self.db_path == ':memory:':
+            self.db_path = 'file:ffixv_memdb?mode=memory&cache=shared'
+            self._uri = True
+        if self._uri and 'memory' in self.db_path:
+            # 共享内存库在最后一条连接关闭时销毁，留一条锚连接保住数据
+            self._anchor = sqlite3.connect(self.db_path, uri=True)
         # 不再创建任何目录
+        # 每个线程复用一条长连接（主线程+各工作线程各一条）
+        # 免去每次操作connect/close的系统调用，也让SQLite页缓存跨查询保持热
+        self._local = threading.local()
+        # 设置项的写穿缓存：读走内存，set_setting提交后回填
+        self._settings_cache: Dict[str, str] = {}
+        self._tax_rate_float: Optional[float] = None
+        # 按ID取行的进程内缓存：行内容在两次编辑之间不变，热ID免去SQLite往返
+        # 只做失效不做写穿，事务回滚后下一次读取自然取回旧值
+        self._row_cache: Dict[tuple, Dict[str, Any]] = {}
+        # 数据版本号：每次写提交后+1，上层缓存（如BOMCalculator）据此自动失效
+        # 失效判定跟着写入走，不用各个界面入口记得手动刷新
+        self.data_version = 0
         self.init_database()
-    
+        # 退出时跑一次PRAGMA optimize，统计过期时做小范围ANALYZE
+        # 保证查询计划器对recipe_requirements两个复合索引的选择性估计不失真
+        # 弱引用登记，实例被替换后可正常GC，不会钉在atexit表里
+        _live_managers.add(self)
+
+    def _optimize_on_exit(self):
+        """进程退出钩子：刷新查询计划器统计（统计新鲜时近似零开销）
+        atexit在主线程执行，这里拿到的正是跑过绝大多数查询的主线程长连接，
+        optimize据其查询历史决定要不要做针对性ANALYZE
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        try:
+            conn.execute('PRAGMA optimize')
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """关闭本线程持有的长连接（读写+只读），供显式收尾时调用
+        sqlite3连接默认绑定创建线程，这里只能关当前线程自己那两条；
+        工作线程结束时线程局部存储随之释放，连接由GC回收
+        """
+        for attr in ('conn', 'ro_conn'):
+            conn = getattr(self._local, attr, None)
+            if conn is not None:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                setattr(self._local, attr, None)
+
+    @contextmanager
+    def transaction(self):
+        """调用方控制的事务边界：把多次修改合并成一次提交/一次fsync
+        用法：with db.transaction() as cur: db.add_recipe_requirement(..., cursor=cur)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except Exception:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                self.data_version += 1
+
+    def _write(self, sql: str, params, cursor=None):
+        """执行一条写语句：传入cursor时挂进外层事务由调用方提交，否则立即提交
+        返回fetchone结果（供RETURNING语句取新ID）
+        """
+        if cursor is not None:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+        with self.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            row = cur.fetchone()
+            conn.commit()
+            self.data_version += 1
+            return row
+
+    def _fetch_by_id_cached(self, table: str, sql: str, row_id: int) -> Optional[Dict[str, Any]]:
+        """按(表, ID)缓存的单行查询；命中和未命中都返回副本，调用方改动不会污染缓存"""
+        key = (table, row_id)
+        row = self._row_cache.get(key)
+        if row is None:
+            row = self._fetch_one(sql, (row_id,))
+            if row is None:
+                return None
+            if len(self._row_cache) >= 4096:
+                self._row_cache.clear()
+            self._row_cache[key] = row
+        return dict(row)
+
+    def _fetch_one(self, sql: str, params) -> Optional[Dict[str, Any]]:
+        """单行查询转dict，各按ID/名称取数的方法共用同一形状"""
+        with self.get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def _fetch_all(self, sql: str) -> List[Dict[str, Any]]:
+        """整表列表查询转dict列表，各列表方法共用"""
+        with self.get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            return _dict_rows(cursor)
+
+    def _thread_connection(self, readonly: bool = False) -> sqlite3.Connection:
+        """取当前线程的连接，首次使用时创建并配置好
+        readonly=True时走mode=ro打开的只读连接，纯读操作不沾写锁簿记
+        """
+        attr = 'ro_conn' if readonly else 'conn'
+        conn = getattr(self._local, attr, None)
+        if conn is None:
+            if readonly:
+                conn = self._connect_readonly()
+                if conn is None:
+                    # 打不开只读连接（URI库等特殊情况）就退回读写连接
+                    return self._thread_connection()
+            else:
+                conn = sqlite3.connect(self.db_path, uri=self._uri, cached_statements=256)
+            conn.executescript(_CONNECTION_PRAGMAS)
+            conn.row_factory = sqlite3.Row  # 使查询结果可以像字典一样访问
+            setattr(self._local, attr, conn)
+        return conn
+
+    def _connect_readonly(self) -> Optional[sqlite3.Connection]:
+        """尝试以mode=ro打开只读连接，失败返回None"""
+        if self._uri:
+            # 内存库/自定义URI没有通用的只读形式，统一复用读写连接
+            return None
+        try:
+            return sqlite3.connect(
+                f'file:{self.db_path}?mode=ro', uri=True, cached_statements=256)
+        except sqlite3.Error:
+            return None
+
     @contextmanager
-    def get_connection(self):
+    def get_connection(self, readonly: bool = False):
         """获取数据库连接的上下文管理器"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # 使查询结果可以像字典一样访问
+        conn = self._thread_connection(readonly)
         try:
             yield conn
         finally:
-            conn.close()
-    
+            # 连接复用，出块时不关闭；异常留下的未提交事务必须回滚
+            # 否则脏状态会泄漏到本线程的下一次使用
+            if conn.in_transaction:
+                conn.rollback()
+    
+    def load_from_disk(self, path: str):
+        """用backup API把磁盘库整体灌进当前库（内存库启动时的水合入口）"""
+        src = sqlite3.connect(path)
+        try:
+            with self.get_connection() as conn:
+                src.backup(conn)
+        finally:
+            src.close()
+        # 整库被替换，进程内缓存作废
+        self._settings_cache.clear()
+        self._tax_rate_float = None
+        self._row_cache.clear()
+        self.data_version += 1
+
     def init_database(self):
         """初始化数据库表结构"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            # 创建原材料表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS base_materials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    description TEXT,
-                    cost REAL DEFAULT 0.0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 检查并添加cost字段（用于数据库迁移）
-            cursor.execute("PRAGMA table_info(base_materials)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'cost' not in columns:
-                cursor.execute('ALTER TABLE base_materials ADD COLUMN cost REAL DEFAULT 0.0')
-            
-            # 创建半成品表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS materials (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    output_quantity INTEGER DEFAULT 1,
-                    description TEXT,
-                    price REAL DEFAULT 0.0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 检查并添加price字段（用于数据库迁移）
-            cursor.execute("PRAGMA table_info(materials)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'price' not in columns:
-                cursor.execute('ALTER TABLE materials ADD COLUMN price REAL DEFAULT 0.0')
-            
-            # 创建成品表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    output_quantity INTEGER DEFAULT 1,
-                    description TEXT,
-                    price REAL DEFAULT 0.0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 检查并添加price字段（用于数据库迁移）
-            cursor.execute("PRAGMA table_info(products)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'price' not in columns:
-                cursor.execute('ALTER TABLE products ADD COLUMN price REAL DEFAULT 0.0')
-            
-            # 创建配方需求表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS recipe_requirements (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    recipe_type TEXT NOT NULL CHECK(recipe_type IN ('material', 'product')),
-                    recipe_id INTEGER NOT NULL,
-                    ingredient_type TEXT NOT NULL CHECK(ingredient_type IN ('base', 'material')),
-                    ingredient_id INTEGER NOT NULL,
-                    quantity REAL NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 创建设置表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # 创建索引
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_recipe_requirements_recipe 
-                ON recipe_requirements(recipe_type, recipe_id)
-            ''')
-            
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_recipe_requirements_ingredient 
-                ON recipe_requirements(ingredient_type, ingredient_id)
-            ''')
-            
+            # 旧库升级时FTS表是本次新建的，记下来以便建完后回填索引
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name = 'base_materials_fts'")
+            fts_existed = cursor.fetchone()[0] > 0
+
+            # 所有DDL合并成一个脚本，单事务执行，启动时只落一次盘
+            conn.executescript(_SCHEMA_DDL)
+
+            if not fts_existed:
+                # 从原表重建FTS索引，之后由触发器增量维护
+                cursor.execute("INSERT INTO base_materials_fts(base_materials_fts) VALUES ('rebuild')")
+                cursor.execute("INSERT INTO materials_fts(materials_fts) VALUES ('rebuild')")
+                cursor.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+            # 旧库迁移是一次性的：做完把user_version置1，之后的启动只读一个单元格就跳过
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] < 1:
+                # 缺列时ALTER成功，已有列时直接吞掉报错
+                for alter_sql in (
+                    'ALTER TABLE base_materials ADD COLUMN cost REAL DEFAULT 0.0',
+                    'ALTER TABLE materials ADD COLUMN price REAL DEFAULT 0.0',
+                    'ALTER TABLE products ADD COLUMN price REAL DEFAULT 0.0',
+                ):
+                    try:
+                        cursor.execute(alter_sql)
+                    except sqlite3.OperationalError:
+                        pass
+                cursor.execute('PRAGMA user_version = 1')
+
             conn.commit()
-    
+            # WAL是持久属性，初始化时切换一次即可，后续连接直接沿用
+            cursor.execute('PRAGMA journal_mode=WAL')
+
     # 原材料操作
-    def add_base_material(self, name: str, description: str = None, cost: float = 0) -> int:
+    def add_base_material(self, name: str, description: str = None, cost: float = 0,
+                          cursor=None) -> int:
         """添加原材料"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO base_materials (name, description, cost) VALUES (?, ?, ?)',
-                (name, description, cost)
-            )
-            conn.commit()
-            return cursor.lastrowid
+        return self._write(
+            'INSERT INTO base_materials (name, description, cost) VALUES (?, ?, ?) RETURNING id',
+            (name, description, cost), cursor
+        )[0]
     
     def get_base_materials(self) -> List[Dict[str, Any]]:
         """获取所有原材料"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM base_materials ORDER BY name')
-            return [dict(row) for row in cursor.fetchall()]
+        return self._fetch_all(_SQL_LIST_BASE)
     
+    def get_base_materials_brief(self) -> List[Dict[str, Any]]:
+        """获取所有原材料的窄版本（id/name/cost），跳过description等宽列的搬运开销"""
+        return self._fetch_all(_SQL_LIST_BASE_BRIEF)
+
     def get_base_material_by_id(self, material_id: int) -> Optional[Dict[str, Any]]:
         """根据ID获取原材料"""
-        with self.get_connection() as conn:
+        return self._fetch_by_id_cached('base_materials', _SQL_GET_BASE_BY_ID, material_id)
+    
+    def upsert_base_material(self, name: str, cursor=None) -> int:
+        """确保指定名称的原材料存在，返回其ID（一条语句完成查询/插入）"""
+        return self._write(
+            'INSERT INTO base_materials (name) VALUES (?) '
+            'ON CONFLICT(name) DO UPDATE SET name = name RETURNING id',
+            (name,), cursor
+        )[0]
+
+    def get_base_materials_by_ids(self, ids: List[int]) -> List[Dict[str, Any]]:
+        """按ID列表批量获取原材料，分批避免超出SQLite参数上限"""
+        if not ids:
+            return []
+        result = []
+        with self.get_connection(readonly=True) as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM base_materials WHERE id = ?', (material_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
-    
+            for start in range(0, len(ids), 900):
+                chunk = ids[start:start + 900]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(
+                    f'SELECT id, name, cost FROM base_materials WHERE id IN ({placeholders})',
+                    chunk
+                )
+                result.extend(_dict_rows(cursor))
+        return result
+
     def get_base_material_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """根据名称获取原材料"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM base_materials WHERE name = ?', (name,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        return self._fetch_one(_SQL_GET_BASE_BY_NAME, (name,))
     
-    def update_base_material(self, material_id: int, name: str, description: str = None, cost: float = 0):
+    def update_base_material(self, material_id: int, name: str, description: str = None,
+                             cost: float = 0, cursor=None):
         """更新原材料名称、描述和单价"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE base_materials SET name = ?, description = ?, cost = ? WHERE id = ?',
-                (name, description, cost, material_id)
-            )
-            conn.commit()
+        self._write(
+            'UPDATE base_materials SET name = ?, description = ?, cost = ? WHERE id = ?',
+            (name, description, cost, material_id), cursor
+        )
+        self._row_cache.pop(('base_materials', material_id), None)
     
     # 半成品操作
-    def add_material(self, name: str, output_quantity: int = 1, description: str = None, price: float = 0.0) -> int:
+    def add_material(self, name: str, output_quantity: int = 1, description: str = None,
+                     price: float = 0.0, cursor=None) -> int:
         """添加半成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO materials (name, output_quantity, description, price) VALUES (?, ?, ?, ?)',
-                (name, output_quantity, description, price)
-            )
-            conn.commit()
-            return cursor.lastrowid
+        return self._write(
+            'INSERT INTO materials (name, output_quantity, description, price) '
+            'VALUES (?, ?, ?, ?) RETURNING id',
+            (name, output_quantity, description, price), cursor
+        )[0]
     
     def get_materials(self) -> List[Dict[str, Any]]:
         """获取所有半成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM materials ORDER BY name')
-            return [dict(row) for row in cursor.fetchall()]
+        return self._fetch_all(_SQL_LIST_MATERIALS)
     
+    def get_materials_brief(self) -> List[Dict[str, Any]]:
+        """获取所有半成品的窄版本（id/name/output_quantity/price）"""
+        return self._fetch_all(_SQL_LIST_MATERIALS_BRIEF)
+
     def get_material_by_id(self, material_id: int) -> Optional[Dict[str, Any]]:
         """根据ID获取半成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM materials WHERE id = ?', (material_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        return self._fetch_by_id_cached('materials', _SQL_GET_MATERIAL_BY_ID, material_id)
     
     def get_material_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """根据名称获取半成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM materials WHERE name = ?', (name,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        return self._fetch_one(_SQL_GET_MATERIAL_BY_NAME, (name,))
     
-    def update_material(self, material_id: int, name: str, output_quantity: int = 1, description: str = None, price: float = 0.0):
+    def update_material(self, material_id: int, name: str, output_quantity: int = 1,
+                        description: str = None, price: float = 0.0, cursor=None):
         """更新半成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE materials SET name = ?, output_quantity = ?, description = ?, price = ? WHERE id = ?',
-                (name, output_quantity, description, price, material_id)
-            )
-            conn.commit()
+        self._write(
+            'UPDATE materials SET name = ?, output_quantity = ?, description = ?, price = ? WHERE id = ?',
+            (name, output_quantity, description, price, material_id), cursor
+        )
+        self._row_cache.pop(('materials', material_id), None)
     
     # 成品操作
-    def add_product(self, name: str, output_quantity: int = 1, description: str = None, price: float = 0.0) -> int:
+    def add_product(self, name: str, output_quantity: int = 1, description: str = None,
+                    price: float = 0.0, cursor=None) -> int:
         """添加成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO products (name, output_quantity, description, price) VALUES (?, ?, ?, ?)',
-                (name, output_quantity, description, price)
-            )
-            conn.commit()
-            return cursor.lastrowid
+        return self._write(
+            'INSERT INTO products (name, output_quantity, description, price) '
+            'VALUES (?, ?, ?, ?) RETURNING id',
+            (name, output_quantity, description, price), cursor
+        )[0]
     
     def get_products(self) -> List[Dict[str, Any]]:
         """获取所有成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM products ORDER BY name')
-            return [dict(row) for row in cursor.fetchall()]
+        return self._fetch_all(_SQL_LIST_PRODUCTS)
     
+    def get_products_brief(self) -> List[Dict[str, Any]]:
+        """获取所有成品的窄版本（id/name/output_quantity/price）"""
+        return self._fetch_all(_SQL_LIST_PRODUCTS_BRIEF)
+
     def get_product_by_id(self, product_id: int) -> Optional[Dict[str, Any]]:
         """根据ID获取成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM products WHERE id = ?', (product_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        return self._fetch_by_id_cached('products', _SQL_GET_PRODUCT_BY_ID, product_id)
     
     def get_product_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         """根据名称获取成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM products WHERE name = ?', (name,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+        return self._fetch_one(_SQL_GET_PRODUCT_BY_NAME, (name,))
     
-    def update_product(self, product_id: int, name: str, output_quantity: int = 1, description: str = None, price: float = 0.0):
+    def update_product(self, product_id: int, name: str, output_quantity: int = 1,
+                       description: str = None, price: float = 0.0, cursor=None):
         """更新成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'UPDATE products SET name = ?, output_quantity = ?, description = ?, price = ? WHERE id = ?',
-                (name, output_quantity, description, price, product_id)
-            )
-            conn.commit()
+        self._write(
+            'UPDATE products SET name = ?, output_quantity = ?, description = ?, price = ? WHERE id = ?',
+            (name, output_quantity, description, price, product_id), cursor
+        )
+        self._row_cache.pop(('products', product_id), None)
     
     # 配方需求操作
-    def add_recipe_requirement(self, recipe_type: str, recipe_id: int, 
-                             ingredient_type: str, ingredient_id: int, quantity: float):
+    def add_recipe_requirement(self, recipe_type: str, recipe_id: int,
+                             ingredient_type: str, ingredient_id: int, quantity: float,
+                             cursor=None):
         """添加配方需求"""
+        self._write(
+            _SQL_INSERT_REQUIREMENT,
+            (recipe_type, recipe_id, ingredient_type, ingredient_id, quantity), cursor
+        )
+    
+    def add_recipe_requirements(self, rows: List[tuple]):
+        """批量添加配方需求，一个事务一次executemany
+        :param rows: [(recipe_type, recipe_id, ingredient_type, ingredient_id, quantity)]
+        """
+        if not rows:
+            return
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''INSERT INTO recipe_requirements 
-                   (recipe_type, recipe_id, ingredient_type, ingredient_id, quantity) 
-                   VALUES (?, ?, ?, ?, ?)''',
-                (recipe_type, recipe_id, ingredient_type, ingredient_id, quantity)
-            )
+            conn.cursor().executemany(_SQL_INSERT_REQUIREMENT, rows)
             conn.commit()
-    
-    def get_recipe_requirements(self, recipe_type: str, recipe_id: int) -> List[Dict[str, Any]]:
-        """获取配方需求"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''SELECT * FROM recipe_requirements 
-                   WHERE recipe_type = ? AND recipe_id = ?''',
-                (recipe_type, recipe_id)
-            )
-            return [dict(row) for row in cursor.fetchall()]
-    
-    def delete_recipe_requirements(self, recipe_type: str, recipe_id: int):
-        """删除配方的所有需求"""
+        self.data_version += 1
+
+    def replace_recipe_requirements(self, recipe_type: str, recipe_id: int, rows: List[tuple]):
+        """原子替换某个配方的全部需求（删除+批量插入同一事务）
+        :param rows: [(ingredient_type, ingredient_id, quantity)]
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
                 'DELETE FROM recipe_requirements WHERE recipe_type = ? AND recipe_id = ?',
                 (recipe_type, recipe_id)
             )
+            cursor.executemany(
+                _SQL_INSERT_REQUIREMENT,
+                [(recipe_type, recipe_id) + tuple(row) for row in rows]
+            )
             conn.commit()
+        self.data_version += 1
+
+    def get_recipe_requirements(self, recipe_type: str, recipe_id: int) -> List[Dict[str, Any]]:
+        """获取配方需求"""
+        with self.get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(_SQL_GET_RECIPE_REQS, (recipe_type, recipe_id))
+            return _dict_rows(cursor)
+
+    def get_all_recipe_requirements(self, recipe_type: str) -> List[Dict[str, Any]]:
+        """一次取回某类型全部配方的需求行（按recipe_id排序），供导出等整表遍历
+        避免逐配方调用get_recipe_requirements的N+1查询"""
+        with self.get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(_SQL_GET_ALL_RECIPE_REQS, (recipe_type,))
+            return _dict_rows(cursor)
+
+
+    def delete_recipe_requirements(self, recipe_type: str, recipe_id: int, cursor=None):
+        """删除配方的所有需求"""
+        self._write(
+            'DELETE FROM recipe_requirements WHERE recipe_type = ? AND recipe_id = ?',
+            (recipe_type, recipe_id), cursor
+        )
     
     # 删除操作
-    def delete_base_material(self, material_id: int):
+    def delete_base_material(self, material_id: int, cursor=None):
         """删除原材料"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM base_materials WHERE id = ?', (material_id,))
-            conn.commit()
+        self._write('DELETE FROM base_materials WHERE id = ?', (material_id,), cursor)
+        self._row_cache.pop(('base_materials', material_id), None)
     
-    def delete_material(self, material_id: int):
-        """删除半成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            # 先删除相关的配方需求
-            cursor.execute(
-                'DELETE FROM recipe_requirements WHERE recipe_type = "material" AND recipe_id = ?',
-                (material_id,)
-            )
-            # 删除半成品
-            cursor.execute('DELETE FROM materials WHERE id = ?', (material_id,))
-            conn.commit()
-    
-    def delete_product(self, product_id: int):
-        """删除成品"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            # 先删除相关的配方需求
-            cursor.execute(
-                'DELETE FROM recipe_requirements WHERE recipe_type = "product" AND recipe_id = ?',
-                (product_id,)
-            )
-            # 删除成品
-            cursor.execute('DELETE FROM products WHERE id = ?', (product_id,))
-            conn.commit()
+    def delete_material(self, material_id: int, cursor=None):
+        """删除半成品（配方需求由级联触发器一并清理）"""
+        self._write('DELETE FROM materials WHERE id = ?', (material_id,), cursor)
+        self._row_cache.pop(('materials', material_id), None)
+
+    def delete_product(self, product_id: int, cursor=None):
+        """删除成品（配方需求由级联触发器一并清理）"""
+        self._write('DELETE FROM products WHERE id = ?', (product_id,), cursor)
+        self._row_cache.pop(('products', product_id), None)
     
     def search_items(self, keyword: str) -> Dict[str, List[Dict[str, Any]]]:
         """搜索所有类型的物品"""
@@ -331,149 +653,147 @@ class DatabaseManager:
             'products': []
         }
         
-        with self.get_connection() as conn:
+        pattern = f'%{keyword}%'
+        # trigram索引以3个字符为一个词元，更短的关键字匹配不到任何词元
+        # 这种情况退回原表LIKE扫描，保持原有语义
+        # LIKE打在trigram FTS列上走倒排索引，避免对原表做全表strncmp扫描
+        sql_by_table = _SQL_SEARCH_FTS if len(keyword) >= 3 else _SQL_SEARCH_LIKE
+        with self.get_connection(readonly=True) as conn:
             cursor = conn.cursor()
-            
-            # 搜索原材料
-            cursor.execute(
-                'SELECT * FROM base_materials WHERE name LIKE ? ORDER BY name',
-                (f'%{keyword}%',)
-            )
-            result['base_materials'] = [dict(row) for row in cursor.fetchall()]
-            
-            # 搜索半成品
-            cursor.execute(
-                'SELECT * FROM materials WHERE name LIKE ? ORDER BY name',
-                (f'%{keyword}%',)
-            )
-            result['materials'] = [dict(row) for row in cursor.fetchall()]
-            
-            # 搜索成品
-            cursor.execute(
-                'SELECT * FROM products WHERE name LIKE ? ORDER BY name',
-                (f'%{keyword}%',)
-            )
-            result['products'] = [dict(row) for row in cursor.fetchall()]
-        
+            for table in result:
+                cursor.execute(sql_by_table[table], (pattern,))
+                result[table] = _dict_rows(cursor)
+
         return result
     
     def clear_all_data(self):
         """清空所有数据"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            # 删除所有配方需求
-            cursor.execute('DELETE FROM recipe_requirements')
-            # 删除所有成品
-            cursor.execute('DELETE FROM products')
-            # 删除所有半成品
-            cursor.execute('DELETE FROM materials')
-            # 删除所有原材料
-            cursor.execute('DELETE FROM base_materials')
+            # 整表清空用DROP+重建：不走逐行删除，也不给每行触发FTS同步触发器
+            # 触发器和索引随表DROP消失，由同一份DDL整套重建；设置表保持不动
+            conn.executescript('''
+                DROP TABLE IF EXISTS recipe_requirements;
+                DROP TABLE IF EXISTS base_materials_fts;
+                DROP TABLE IF EXISTS materials_fts;
+                DROP TABLE IF EXISTS products_fts;
+                DROP TABLE IF EXISTS products;
+                DROP TABLE IF EXISTS materials;
+                DROP TABLE IF EXISTS base_materials;
+            ''')
+            conn.executescript(_SCHEMA_DDL)
             conn.commit()
-    
+        self._row_cache.clear()
+        self.data_version += 1
+
     def get_data_statistics(self) -> Dict[str, int]:
         """获取数据统计信息"""
-        with self.get_connection() as conn:
+        with self.get_connection(readonly=True) as conn:
             cursor = conn.cursor()
-            
-            # 统计各类数据数量
-            cursor.execute('SELECT COUNT(*) FROM base_materials')
-            base_count = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM materials')
-            material_count = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM products')
-            product_count = cursor.fetchone()[0]
-            
-            cursor.execute('SELECT COUNT(*) FROM recipe_requirements')
-            recipe_count = cursor.fetchone()[0]
-            
-        stats = {
-            'base_materials': base_count,
-            'materials': material_count,
-            'products': product_count,
-            'recipes': recipe_count
+
+            # 四个COUNT合成一条语句，一次往返拿全所有统计
+            cursor.execute('''
+                SELECT (SELECT COUNT(*) FROM base_materials),
+                       (SELECT COUNT(*) FROM materials),
+                       (SELECT COUNT(*) FROM products),
+                       (SELECT COUNT(*) FROM recipe_requirements)
+            ''')
+            row = cursor.fetchone()
+
+        return {
+            'base_materials': row[0],
+            'materials': row[1],
+            'products': row[2],
+            'recipes': row[3]
         }
-        
-        return stats
     
+    def get_recipe_unit_cost(self, recipe_type: str, recipe_id: int) -> float:
+        """读取配方的单位原材料成本（recipe_base_costs视图，一条SELECT完成展开汇总）"""
+        with self.get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT unit_cost FROM recipe_base_costs WHERE recipe_type = ? AND recipe_id = ?',
+                (recipe_type, recipe_id)
+            )
+            row = cursor.fetchone()
+            return row[0] if row and row[0] is not None else 0.0
+
     def get_recipes_using_ingredient(self, ingredient_type: str, ingredient_id: int) -> List[Dict[str, Any]]:
         """获取使用指定原材料或半成品的配方列表"""
-        with self.get_connection() as conn:
+        with self.get_connection(readonly=True) as conn:
             cursor = conn.cursor()
             
-            # 查询使用该原料的配方
+            # 一条UNION ALL JOIN查出两类配方，免去对每条引用再逐个点查的N+1往返
             cursor.execute('''
-                SELECT DISTINCT rr.recipe_type, rr.recipe_id, rr.quantity
+                SELECT DISTINCT 'material' AS rt, m.id, m.name, m.output_quantity, rr.quantity
                 FROM recipe_requirements rr
-                WHERE rr.ingredient_type = ? AND rr.ingredient_id = ?
-                ORDER BY rr.recipe_type, rr.recipe_id
-            ''', (ingredient_type, ingredient_id))
-            
-            recipe_refs = cursor.fetchall()
+                JOIN materials m ON m.id = rr.recipe_id
+                WHERE rr.recipe_type = 'material'
+                  AND rr.ingredient_type = ? AND rr.ingredient_id = ?
+                UNION ALL
+                SELECT DISTINCT 'product', p.id, p.name, p.output_quantity, rr.quantity
+                FROM recipe_requirements rr
+                JOIN products p ON p.id = rr.recipe_id
+                WHERE rr.recipe_type = 'product'
+                  AND rr.ingredient_type = ? AND rr.ingredient_id = ?
+                ORDER BY 1, 2
+            ''', (ingredient_type, ingredient_id, ingredient_type, ingredient_id))
+
+            type_labels = {'material': '半成品', 'product': '成品'}
             recipes = []
-            
-            for recipe_ref in recipe_refs:
-                recipe_type = recipe_ref['recipe_type']
-                recipe_id = recipe_ref['recipe_id']
-                quantity_needed = recipe_ref['quantity']
-                
-                # 根据配方类型获取配方详情
-                if recipe_type == 'material':
-                    cursor.execute('SELECT * FROM materials WHERE id = ?', (recipe_id,))
-                    recipe_data = cursor.fetchone()
-                    if recipe_data:
-                        recipes.append({
-                            'type': '半成品',
-                            'name': recipe_data['name'],
-                            'output_quantity': recipe_data['output_quantity'],
-                            'quantity_needed': quantity_needed,
-                            'recipe_type': recipe_type,
-                            'recipe_id': recipe_id
-                        })
-                elif recipe_type == 'product':
-                    cursor.execute('SELECT * FROM products WHERE id = ?', (recipe_id,))
-                    recipe_data = cursor.fetchone()
-                    if recipe_data:
-                        recipes.append({
-                            'type': '成品',
-                            'name': recipe_data['name'],
-                            'output_quantity': recipe_data['output_quantity'],
-                            'quantity_needed': quantity_needed,
-                            'recipe_type': recipe_type,
-                            'recipe_id': recipe_id
-                        })
+            for rt, recipe_id, name, output_quantity, quantity_needed in cursor.fetchall():
+                recipes.append({
+                    'type': type_labels[rt],
+                    'name': name,
+                    'output_quantity': output_quantity,
+                    'quantity_needed': quantity_needed,
+                    'recipe_type': rt,
+                    'recipe_id': recipe_id
+                })
             
             return recipes
     
     # 设置操作
-    def set_setting(self, key: str, value: str):
+    def set_setting(self, key: str, value: str, cursor=None):
         """设置配置项"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)',
-                (key, value)
-            )
-            conn.commit()
-    
+        self._write(
+            'INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)',
+            (key, value), cursor
+        )
+        if cursor is not None:
+            # 外层事务还没提交（可能回滚），只把旧缓存作废，下次读取重新查库
+            self._settings_cache.pop(key, None)
+        else:
+            # 提交成功后写穿缓存，后续读取不再碰数据库
+            self._settings_cache[key] = value
+        if key == 'tax_rate':
+            self._tax_rate_float = None
+
     def get_setting(self, key: str, default_value: str = None) -> str:
-        """获取配置项"""
-        with self.get_connection() as conn:
+        """获取配置项（设置只经set_setting修改，进程内缓存可以放心复用）"""
+        if key in self._settings_cache:
+            return self._settings_cache[key]
+        with self.get_connection(readonly=True) as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
             row = cursor.fetchone()
-            return row[0] if row else default_value
-    
+            if row is None:
+                return default_value
+            self._settings_cache[key] = row[0]
+            return row[0]
+
     def get_tax_rate(self) -> float:
         """获取交易税率"""
+        # 每次成本计算都会调用，解析好的浮点值单独缓存
+        if self._tax_rate_float is not None:
+            return self._tax_rate_float
         tax_rate_str = self.get_setting('tax_rate', '5.0')
         try:
-            return float(tax_rate_str)
+            rate = float(tax_rate_str)
         except ValueError:
-            return 5.0
-    
+            rate = 5.0
+        self._tax_rate_float = rate
+        return rate
+
     def set_tax_rate(self, tax_rate: float):
         """设置交易税率"""
         self.set_setting('tax_rate', str(tax_rate))
\ No newline at end of file
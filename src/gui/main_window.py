@@ -10,7 +10,8 @@ from PySide6.QtWidgets import (
     QListWidget, QListWidgetItem, QScrollArea, QFrame, QDialogButtonBox, QCheckBox,
     QListView
 )
-from PySide6.QtCore import Qt, QThread, Signal, QTimer, QRect, QPoint, QEvent, QSize
+from PySide6.QtCore import (Qt, QObject, QRunnable, QThreadPool, Signal, QTimer,
+                            QRect, QPoint, QEvent, QSize)
 from PySide6.QtGui import QFont, QIcon, QPixmap, QColor, QPainter
 from loguru import logger
 
@@ -33,7 +34,6 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.database import DatabaseManager
 from core.calculator import BOMCalculator
 from core.csv_importer import CSVImporter
-from core.data_migrator import DataMigrator
 from config import ICON_SIZE, GRID_SIZE, ICON_SPACING, TABLE_ROW_HEIGHT
 
 DEBUG_LOG = False  # True开启debug日志，False关闭
@@ -254,13 +254,21 @@ class CustomQuantityWidget(QWidget):
             self.update_button_states()
 
 
-class CalculationWorker(QThread):
-    """计算工作线程"""
+class WorkerSignals(QObject):
+    """后台任务的信号载体：QRunnable不是QObject，信号挂在这里"""
     finished = Signal(dict)
     error = Signal(str)
-    
+    progress = Signal(str)
+
+
+class CalculationWorker(QRunnable):
+    """计算工作任务，提交到全局线程池复用线程"""
+
     def __init__(self, calculator: BOMCalculator, items: List[Dict[str, Any]]):
         super().__init__()
+        # 调用方保留引用并连接信号，不能让线程池跑完就销毁对象
+        self.setAutoDelete(False)
+        self.signals = WorkerSignals()
         self.calculator = calculator
         self.items = items
     
@@ -268,38 +276,36 @@ class CalculationWorker(QThread):
         try:
             result = self.calculator.calculate_multiple_items(self.items)
             formatted_result = self.calculator.format_requirements_for_display(result)
-            self.finished.emit({'requirements': formatted_result, 'raw': result})
+            self.signals.finished.emit({'requirements': formatted_result, 'raw': result})
         except Exception as e:
-            self.error.emit(str(e))
+            self.signals.error.emit(str(e))
 
 
-class ImportWorker(QThread):
-    """CSV导入工作线程"""
-    finished = Signal(dict)
-    error = Signal(str)
-    progress = Signal(str)
-    
+class ImportWorker(QRunnable):
+    """CSV导入工作任务"""
+
     def __init__(self, csv_importer, file_path: str):
         super().__init__()
+        self.setAutoDelete(False)
+        self.signals = WorkerSignals()
         self.csv_importer = csv_importer
         self.file_path = file_path
     
     def run(self):
         try:
-            self.progress.emit("正在导入CSV数据...")
+            self.signals.progress.emit("正在导入CSV数据...")
             result = self.csv_importer.import_from_csv(self.file_path)
-            self.finished.emit(result)
+            self.signals.finished.emit(result)
         except Exception as e:
-            self.error.emit(str(e))
+            self.signals.error.emit(str(e))
+
+class ExportWorker(QRunnable):
+    """导出工作任务，防止界面卡死"""
 
-class ExportWorker(QThread):
-    """导出工作线程，防止界面卡死"""
-    finished = Signal(dict)
-    error = Signal(str)
-    progress = Signal(str)
-    
     def __init__(self, db_manager, calculator, file_path: str):
         super().__init__()
+        self.setAutoDelete(False)
+        self.signals = WorkerSignals()
         self.db_manager = db_manager
         self.calculator = calculator
         self.file_path = file_path
@@ -316,7 +322,7 @@ class ExportWorker(QThread):
             materials = self.db_manager.get_materials()
             
             if not products and not materials:
-                self.error.emit("没有找到任何成品或半成品数据")
+                self.signals.error.emit("没有找到任何成品或半成品数据")
                 return
             
             # 准备CSV数据
@@ -328,15 +334,18 @@ class ExportWorker(QThread):
             
             processed_count = 0
             total_items = len(products) + len(materials)
-            
+
+            # 税率整个导出过程不会变，循环外查一次即可
+            tax_rate = self.db_manager.get_tax_rate()
+
             # 处理成品
             for product in products:
                 if self._is_cancelled:
-                    self.error.emit("导出已取消")
+                    self.signals.error.emit("导出已取消")
                     return
                 
                 try:
-                    self.progress.emit(f"正在处理成品: {product['name']} ({processed_count + 1}/{total_items})")
+                    self.signals.progress.emit(f"正在处理成品: {product['name']} ({processed_count + 1}/{total_items})")
                     
                     # 计算成本
                     cost_info = self.calculator.calculate_item_cost(
@@ -344,10 +353,7 @@ class ExportWorker(QThread):
                         product['id'], 
                         product.get('output_quantity', 1)
                     )
-                    
-                    # 获取交易税率
-                    tax_rate = self.db_manager.get_tax_rate()
-                    
+
                     # 计算税后售价和利润
                     market_price = product.get('price', 0)
                     unit_cost = cost_info['unit_cost']
@@ -383,7 +389,7 @@ class ExportWorker(QThread):
                     
                 except Exception as e:
                     # 如果某个产品计算失败，记录错误但继续处理其他产品
-                    self.progress.emit(f"处理失败: {product['name']} - {str(e)}")
+                    self.signals.progress.emit(f"处理失败: {product['name']} - {str(e)}")
                     csv_data.append([
                         product['name'],
                         '成品',
@@ -402,11 +408,11 @@ class ExportWorker(QThread):
             # 处理半成品
             for material in materials:
                 if self._is_cancelled:
-                    self.error.emit("导出已取消")
+                    self.signals.error.emit("导出已取消")
                     return
                 
                 try:
-                    self.progress.emit(f"正在处理半成品: {material['name']} ({processed_count + 1}/{total_items})")
+                    self.signals.progress.emit(f"正在处理半成品: {material['name']} ({processed_count + 1}/{total_items})")
                     
                     # 计算成本
                     cost_info = self.calculator.calculate_item_cost(
@@ -414,10 +420,7 @@ class ExportWorker(QThread):
                         material['id'], 
                         material.get('output_quantity', 1)
                     )
-                    
-                    # 获取交易税率
-                    tax_rate = self.db_manager.get_tax_rate()
-                    
+
                     # 计算税后售价和利润
                     market_price = material.get('price', 0)
                     unit_cost = cost_info['unit_cost']
@@ -453,7 +456,7 @@ class ExportWorker(QThread):
                     
                 except Exception as e:
                     # 如果某个半成品计算失败，记录错误但继续处理其他物品
-                    self.progress.emit(f"处理失败: {material['name']} - {str(e)}")
+                    self.signals.progress.emit(f"处理失败: {material['name']} - {str(e)}")
                     csv_data.append([
                         material['name'],
                         '半成品',
@@ -470,9 +473,11 @@ class ExportWorker(QThread):
                     continue
             
             # 写入CSV文件
-            self.progress.emit("正在写入文件...")
+            self.signals.progress.emit("正在写入文件...")
             import csv
-            with open(self.file_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
+            # 大缓冲一次性刷盘，减少write系统调用次数
+            with open(self.file_path, 'w', newline='', encoding='utf-8-sig',
+                      buffering=1024 * 1024) as csvfile:
                 writer = csv.writer(csvfile)
                 writer.writerows(csv_data)
             
@@ -490,10 +495,10 @@ class ExportWorker(QThread):
                 'file_path': self.file_path
             }
             
-            self.finished.emit(result)
+            self.signals.finished.emit(result)
             
         except Exception as e:
-            self.error.emit(f"导出失败: {str(e)}")
+            self.signals.error.emit(f"导出失败: {str(e)}")
 
 
 class CreateMissingItemDialog(QDialog):
@@ -507,9 +512,15 @@ class CreateMissingItemDialog(QDialog):
         self.setWindowTitle(f"创建{item_type}: {item_name}")
         self.setMinimumSize(400, 300)
         self.resize(500, 400)
-        
+
+        # 对话框生命周期内原材料整表只查一次，选项刷新和保存校验都走这份映射
+        self._base_by_name = {m['name']: m for m in db_manager.get_base_materials_brief()}
+        # 需求数据以这份Python列表为准，与列表控件同序维护
+        # 控件只负责展示，查重/收集都不再逐项回读Qt模型
+        self._requirements = []
+        self._requirement_names = set()
         self.init_ui()
-    
+
     def init_ui(self):
         layout = QVBoxLayout(self)
         
@@ -572,9 +583,8 @@ class CreateMissingItemDialog(QDialog):
     
     def update_requirement_options(self):
         """更新需求选项"""
-        base_materials = self.db_manager.get_base_materials()
         self.req_name_combo.clear()
-        self.req_name_combo.addItems([m['name'] for m in base_materials])
+        self.req_name_combo.addItems(list(self._base_by_name))
     
     def add_requirement(self):
         """添加配方需求"""
@@ -586,70 +596,69 @@ class CreateMissingItemDialog(QDialog):
             return
         
         # 检查是否已存在
-        for i in range(self.requirements_list.count()):
-            item = self.requirements_list.item(i)
-            if item.data(Qt.UserRole)['name'] == req_name:
-                QMessageBox.warning(self, "警告", "该需求已存在")
-                return
-        
+        if req_name in self._requirement_names:
+            QMessageBox.warning(self, "警告", "该需求已存在")
+            return
+
         # 添加到列表
         item_text = f"原材料: {req_name} x{req_quantity}"
         list_item = QListWidgetItem(item_text)
-        list_item.setData(Qt.UserRole, {
-            'name': req_name,
-            'quantity': req_quantity
-        })
         icon_path = get_icon_path(req_name, 'base')
         if icon_path:
             list_item.setIcon(QIcon(icon_path))
         self.requirements_list.addItem(list_item)
-    
+        self._requirements.append({'name': req_name, 'quantity': req_quantity})
+        self._requirement_names.add(req_name)
+
     def remove_requirement(self):
         """删除选中的需求"""
         current_item = self.requirements_list.currentItem()
         if current_item:
-            self.requirements_list.takeItem(self.requirements_list.row(current_item))
+            row = self.requirements_list.row(current_item)
+            self._requirement_names.discard(self._requirements[row]['name'])
+            del self._requirements[row]
+            self.requirements_list.takeItem(row)
     
     def accept_creation(self):
         """确认创建物品"""
         output_quantity = self.quantity_spin.value()
-        
-        # 收集需求
-        requirements = []
-        for i in range(self.requirements_list.count()):
-            item = self.requirements_list.item(i)
-            req_data = item.data(Qt.UserRole)
-            requirements.append(req_data)
-        
-        # 检查原材料是否存在，不存在则创建
-        for req in requirements:
-            base_material = self.db_manager.get_base_material_by_name(req['name'])
-            if not base_material:
-                reply = QMessageBox.question(
-                    self, "缺少原材料", 
-                    f"未检测到原材料 '{req['name']}'，是否创建？",
-                    QMessageBox.Yes | QMessageBox.No
-                )
-                if reply == QMessageBox.Yes:
-                    try:
-                        self.db_manager.add_base_material(req['name'])
-                    except Exception as e:
-                        QMessageBox.critical(self, "错误", f"创建原材料失败: {str(e)}")
-                        return
-                else:
-                    return
-        
+
+        # 需求直接取自平行列表
+        requirements = list(self._requirements)
+
+        # 检查原材料是否存在（存在性直接查缓存映射）
+        # 缺失的先收齐，只弹一次确认框，不逐个打断用户
+        missing = [req['name'] for req in requirements
+                   if req['name'] not in self._base_by_name]
+        if missing:
+            reply = QMessageBox.question(
+                self, "缺少原材料",
+                f"未检测到原材料: {'、'.join(missing)}，是否全部创建？",
+                QMessageBox.Yes | QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+            try:
+                # 同一事务整批创建，失败时一个都不留
+                with self.db_manager.transaction() as cursor:
+                    for name in missing:
+                        new_id = self.db_manager.add_base_material(name, cursor=cursor)
+                        self._base_by_name[name] = {'id': new_id, 'name': name, 'cost': 0.0}
+            except Exception as e:
+                # 回滚后缓存映射也要清掉半截条目
+                for name in missing:
+                    self._base_by_name.pop(name, None)
+                QMessageBox.critical(self, "错误", f"创建原材料失败: {str(e)}")
+                return
+
         try:
             # 创建半成品
             item_id = self.db_manager.add_material(self.item_name, output_quantity)
-            
-            # 添加配方需求
-            for req in requirements:
-                base_material = self.db_manager.get_base_material_by_name(req['name'])
-                if base_material:
-                    self.db_manager.add_recipe_requirement(
-                        'material', item_id, 'base', base_material['id'], req['quantity']
-                    )
+
+            # 需求行整批写入（原材料ID全部在缓存映射里，不再按名称重查）
+            self.db_manager.add_recipe_requirements(
+                [('material', item_id, 'base', self._base_by_name[req['name']]['id'],
+                  req['quantity']) for req in requirements])
             
             self.accept()
             
@@ -663,7 +672,15 @@ class MaterialAddDialog(QDialog):
         self.setWindowTitle("添加半成品")
         self.setMinimumSize(600, 500)
         self.resize(700, 600)
+        self._reload_option_cache()
+        # 需求数据以平行的Python列表为准（与控件同序），名称集合查重O(1)
+        self._requirements = []
+        self._requirement_names = set()
         self.init_ui(initial_name)
+    def _reload_option_cache(self):
+        """名称->行映射各查一次，类型切换/筛选/保存都不再回库"""
+        self._base_by_name = {m['name']: m for m in self.db_manager.get_base_materials_brief()}
+        self._mat_by_name = {m['name']: m for m in self.db_manager.get_materials_brief()}
     def init_ui(self, initial_name=""):
         main_layout = QVBoxLayout(self)
         # 基本信息区
@@ -740,36 +757,42 @@ class MaterialAddDialog(QDialog):
         search_text = self.search_edit.text().strip().lower() if hasattr(self, 'search_edit') else ""
         items = []
         if type_text in ("全部", "原材料"):
-            items += ["原材料: " + m['name'] for m in self.db_manager.get_base_materials()]
+            items += ["原材料: " + name for name in self._base_by_name]
         if type_text in ("全部", "半成品"):
-            items += ["半成品: " + m['name'] for m in self.db_manager.get_materials()]
+            items += ["半成品: " + name for name in self._mat_by_name]
         if search_text:
             items = [i for i in items if search_text in i.lower()]
-        self.option_list.clear()
-        for name in items:
-            item = QListWidgetItem(name)
-            if name.startswith("原材料:"):
-                real_name = name.split(":", 1)[1].strip()
-                icon_path = get_icon_path(real_name, 'base')
-            elif name.startswith("半成品:"):
-                real_name = name.split(":", 1)[1].strip()
-                icon_path = get_icon_path(real_name, 'material')
-            else:
-                real_name = name
-                icon_path = get_icon_path(real_name)
-            if icon_path:
-                item.setIcon(QIcon(icon_path))
-            self.option_list.addItem(item)
+        # 整批填充只重绘一次
+        self.option_list.setUpdatesEnabled(False)
+        try:
+            self.option_list.clear()
+            for name in items:
+                item = QListWidgetItem(name)
+                if name.startswith("原材料:"):
+                    real_name = name.split(":", 1)[1].strip()
+                    icon_path = get_icon_path(real_name, 'base')
+                elif name.startswith("半成品:"):
+                    real_name = name.split(":", 1)[1].strip()
+                    icon_path = get_icon_path(real_name, 'material')
+                else:
+                    real_name = name
+                    icon_path = get_icon_path(real_name)
+                if icon_path:
+                    item.setIcon(QIcon(icon_path))
+                self.option_list.addItem(item)
+        finally:
+            self.option_list.setUpdatesEnabled(True)
     def on_add_base_material_in_dialog(self):
         # 自动带入当前搜索内容
         initial_name = self.search_edit.text().strip()
         name, ok = QInputDialog.getText(self, "添加原材料", "请输入原材料名称：", text=initial_name)
         name = name.strip()
         if ok and name:
-            if self.db_manager.get_base_material_by_name(name):
+            if name in self._base_by_name:
                 QMessageBox.warning(self, "警告", f"已存在原材料: {name}")
                 return
-            self.db_manager.add_base_material(name)
+            new_id = self.db_manager.add_base_material(name)
+            self._base_by_name[name] = {'id': new_id, 'name': name, 'cost': 0.0}
             QMessageBox.information(self, "成功", f"已添加原材料: {name}")
             self.update_option_list()
     def on_add_material_in_dialog(self):
@@ -777,73 +800,65 @@ class MaterialAddDialog(QDialog):
         initial_name = self.search_edit.text().strip()
         dialog = MaterialAddDialog(self, self.db_manager, initial_name=initial_name)
         if dialog.exec() == QDialog.Accepted:
+            self._reload_option_cache()
             self.update_option_list()
     def add_selected_option(self):
         for item in self.option_list.selectedItems():
             name = item.text()
-            exists = False
-            for i in range(self.requirements_list.count()):
-                # 只比对名称部分（不含数量）
-                base_name = self.requirements_list.item(i).text().split('x')[0].strip()
-                if base_name == name:
-                    exists = True
-                    break
-            if not exists:
+            # 只比对名称部分（不含数量），集合一次命中
+            if name not in self._requirement_names:
                 # 弹出数量输入框
                 quantity, ok = QInputDialog.getInt(self, "请输入数量", f"为 {name} 输入数量：", 1, 1, 9999, 1)
                 if not ok:
                     continue
-                # 设置图标
-                if name.startswith("原材料:"):
-                    real_name = name.split(":", 1)[1].strip()
-                    icon_path = get_icon_path(real_name, 'base')
-                elif name.startswith("半成品:"):
+                # 类型和ID在添加时就从缓存解析好，保存时不再回查
+                if name.startswith("半成品:"):
+                    req_type = 'material'
                     real_name = name.split(":", 1)[1].strip()
                     icon_path = get_icon_path(real_name, 'material')
+                    option_row = self._mat_by_name.get(real_name)
                 else:
-                    real_name = name
-                    icon_path = get_icon_path(real_name)
+                    req_type = 'base'
+                    real_name = name.split(":", 1)[1].strip() if ':' in name else name
+                    icon_path = get_icon_path(real_name, 'base')
+                    option_row = self._base_by_name.get(real_name)
+                if option_row is None:
+                    QMessageBox.warning(self, "警告", f"找不到物品: {real_name}")
+                    continue
                 show_text = f"{name} x{quantity}"
                 list_item = QListWidgetItem(show_text)
                 if icon_path:
                     list_item.setIcon(QIcon(icon_path))
                 self.requirements_list.addItem(list_item)
+                self._requirements.append({'type': req_type, 'id': option_row['id'],
+                                           'name': real_name, 'quantity': float(quantity)})
+                self._requirement_names.add(name)
     def remove_selected_requirement(self):
-        for item in self.requirements_list.selectedItems():
-            self.requirements_list.takeItem(self.requirements_list.row(item))
+        # 从后往前删，平行列表的下标在删除过程中保持有效
+        rows = sorted((self.requirements_list.row(item)
+                       for item in self.requirements_list.selectedItems()), reverse=True)
+        for row in rows:
+            self._requirement_names.discard(
+                self.requirements_list.item(row).text().split('x')[0].strip())
+            del self._requirements[row]
+            self.requirements_list.takeItem(row)
     def accept_material(self):
         name = self.name_edit.text().strip()
         if not name:
             QMessageBox.warning(self, "警告", "请输入半成品名称")
             return
         output_quantity = self.quantity_spin.value()
-        requirements = []
-        for i in range(self.requirements_list.count()):
-            text = self.requirements_list.item(i).text()
-            if text.startswith('原材料:'):
-                n = text.split(':', 1)[1].split('x')[0].strip()
-                item = self.db_manager.get_base_material_by_name(n)
-                if not item:
-                    QMessageBox.warning(self, "警告", f"找不到原材料: {n}")
-                    return
-                quantity = 1.0
-                if 'x' in text:
-                    try:
-                        quantity = float(text.split('x')[-1].strip())
-                    except Exception:
-                        pass
-                requirements.append({'type': 'base', 'id': item['id'], 'name': n, 'quantity': quantity})
+        # 需求直接取自平行列表（本对话框只保存原材料需求，与原行为一致）
+        requirements = [req for req in self._requirements if req['type'] == 'base']
         # 检查重名
-        if self.db_manager.get_material_by_name(name):
+        if name in self._mat_by_name or self.db_manager.get_material_by_name(name):
             QMessageBox.warning(self, "警告", f"已存在半成品: {name}")
             return
         # 添加半成品
         item_id = self.db_manager.add_material(name, output_quantity)
-        # 添加配方需求
-        for req in requirements:
-            base_material = self.db_manager.get_base_material_by_name(req['name'])
-            if base_material:
-                self.db_manager.add_recipe_requirement('material', item_id, 'base', base_material['id'], req['quantity'])
+        # 需求行整批写入（ID在收集需求时已解析，不再按名称重查）
+        self.db_manager.add_recipe_requirements(
+            [('material', item_id, 'base', req['id'], req['quantity']) for req in requirements])
         QMessageBox.information(self, "成功", f"已添加半成品: {name}")
         self.accept()
 
@@ -879,7 +894,16 @@ class RecipeEditDialog(QDialog):
         self.name_label = name_label
         self.edit_id = edit_id
         self.edit_type = edit_type
+        self._reload_option_cache()
+        # 需求数据以平行的Python列表为准（与控件同序），名称集合查重O(1)
+        self._requirements = []
+        self._requirement_names = set()
         self.init_ui(name_label, initial_name, initial_quantity)
+    def _reload_option_cache(self):
+        """原材料/半成品窄表各查一次缓存成名称->行映射
+        之后的类型切换、筛选打字和保存校验全部走内存，不再逐次回库"""
+        self._base_by_name = {m['name']: m for m in self.db_manager.get_base_materials_brief()}
+        self._mat_by_name = {m['name']: m for m in self.db_manager.get_materials_brief()}
     def init_ui(self, name_label, initial_name, initial_quantity):
         main_layout = QVBoxLayout(self)
         # 基本信息区
@@ -961,8 +985,13 @@ class RecipeEditDialog(QDialog):
         # 支持Delete键删除
         if obj == self.requirements_list and event.type() == QEvent.KeyPress:
             if event.key() == Qt.Key_Delete:
-                for item in self.requirements_list.selectedItems():
-                    self.requirements_list.takeItem(self.requirements_list.row(item))
+                rows = sorted((self.requirements_list.row(item)
+                               for item in self.requirements_list.selectedItems()), reverse=True)
+                for row in rows:
+                    self._requirement_names.discard(
+                        self.requirements_list.item(row).text().split('x')[0].strip())
+                    del self._requirements[row]
+                    self.requirements_list.takeItem(row)
                 return True
         return super().eventFilter(obj, event)
     def update_option_list(self):
@@ -970,110 +999,98 @@ class RecipeEditDialog(QDialog):
         search_text = self.search_edit.text().strip().lower() if hasattr(self, 'search_edit') else ""
         items = []
         if type_text in ("全部", "原材料"):
-            items += ["原材料: " + m['name'] for m in self.db_manager.get_base_materials()]
+            items += ["原材料: " + name for name in self._base_by_name]
         if type_text in ("全部", "半成品"):
-            items += ["半成品: " + m['name'] for m in self.db_manager.get_materials()]
+            items += ["半成品: " + name for name in self._mat_by_name]
         if search_text:
             items = [i for i in items if search_text in i.lower()]
-        self.option_list.clear()
-        for name in items:
-            item = QListWidgetItem(name)
-            if name.startswith("原材料:"):
-                real_name = name.split(":", 1)[1].strip()
-                icon_path = get_icon_path(real_name, 'base')
-            elif name.startswith("半成品:"):
-                real_name = name.split(":", 1)[1].strip()
-                icon_path = get_icon_path(real_name, 'material')
-            else:
-                real_name = name
-                icon_path = get_icon_path(real_name)
-            if icon_path:
-                item.setIcon(QIcon(icon_path))
-            self.option_list.addItem(item)
+        # 整批填充只重绘一次
+        self.option_list.setUpdatesEnabled(False)
+        try:
+            self.option_list.clear()
+            for name in items:
+                item = QListWidgetItem(name)
+                if name.startswith("原材料:"):
+                    real_name = name.split(":", 1)[1].strip()
+                    icon_path = get_icon_path(real_name, 'base')
+                elif name.startswith("半成品:"):
+                    real_name = name.split(":", 1)[1].strip()
+                    icon_path = get_icon_path(real_name, 'material')
+                else:
+                    real_name = name
+                    icon_path = get_icon_path(real_name)
+                if icon_path:
+                    item.setIcon(QIcon(icon_path))
+                self.option_list.addItem(item)
+        finally:
+            self.option_list.setUpdatesEnabled(True)
     def on_add_base_material_in_dialog(self):
         initial_name = self.search_edit.text().strip()
         name, ok = QInputDialog.getText(self, "添加原材料", "请输入原材料名称：", text=initial_name)
         name = name.strip()
         if ok and name:
-            if self.db_manager.get_base_material_by_name(name):
+            if name in self._base_by_name:
                 QMessageBox.warning(self, "警告", f"已存在原材料: {name}")
                 return
-            self.db_manager.add_base_material(name)
+            new_id = self.db_manager.add_base_material(name)
+            self._base_by_name[name] = {'id': new_id, 'name': name, 'cost': 0.0}
             QMessageBox.information(self, "成功", f"已添加原材料: {name}")
             self.update_option_list()
     def on_add_material_in_dialog(self):
         initial_name = self.search_edit.text().strip()
         dialog = RecipeEditDialog(self, self.db_manager, title="添加半成品", name_label="半成品名称", initial_name=initial_name)
         if dialog.exec() == QDialog.Accepted:
+            # 嵌套对话框里可能新建了任意物品，整份缓存重拉一次
+            self._reload_option_cache()
             self.update_option_list()
     def add_selected_option(self):
         for item in self.option_list.selectedItems():
             name = item.text()
-            exists = False
-            for i in range(self.requirements_list.count()):
-                # 只比对名称部分（不含数量）
-                base_name = self.requirements_list.item(i).text().split('x')[0].strip()
-                if base_name == name:
-                    exists = True
-                    break
-            if not exists:
+            # 只比对名称部分（不含数量），集合一次命中
+            if name not in self._requirement_names:
                 # 弹出数量输入框
                 quantity, ok = QInputDialog.getInt(self, "请输入数量", f"为 {name} 输入数量：", 1, 1, 9999, 1)
                 if not ok:
                             continue
-                # 设置图标
-                if name.startswith("原材料:"):
-                    real_name = name.split(":", 1)[1].strip()
-                    icon_path = get_icon_path(real_name, 'base')
-                elif name.startswith("半成品:"):
+                # 类型和ID在添加时就从缓存解析好，保存时不再回查
+                if name.startswith("半成品:"):
+                    req_type = 'material'
                     real_name = name.split(":", 1)[1].strip()
                     icon_path = get_icon_path(real_name, 'material')
+                    option_row = self._mat_by_name.get(real_name)
                 else:
-                    real_name = name
-                    icon_path = get_icon_path(real_name)
+                    req_type = 'base'
+                    real_name = name.split(":", 1)[1].strip() if ':' in name else name
+                    icon_path = get_icon_path(real_name, 'base')
+                    option_row = self._base_by_name.get(real_name)
+                if option_row is None:
+                    QMessageBox.warning(self, "警告", f"找不到物品: {real_name}")
+                    continue
                 show_text = f"{name} x{quantity}"
                 list_item = QListWidgetItem(show_text)
                 if icon_path:
                     list_item.setIcon(QIcon(icon_path))
                 self.requirements_list.addItem(list_item)
+                self._requirements.append({'type': req_type, 'id': option_row['id'],
+                                           'name': real_name, 'quantity': float(quantity)})
+                self._requirement_names.add(name)
     def remove_selected_requirement(self):
-        for item in self.requirements_list.selectedItems():
-            self.requirements_list.takeItem(self.requirements_list.row(item))
+        # 从后往前删，平行列表的下标在删除过程中保持有效
+        rows = sorted((self.requirements_list.row(item)
+                       for item in self.requirements_list.selectedItems()), reverse=True)
+        for row in rows:
+            self._requirement_names.discard(
+                self.requirements_list.item(row).text().split('x')[0].strip())
+            del self._requirements[row]
+            self.requirements_list.takeItem(row)
     def accept_recipe(self):
         name = self.name_edit.text().strip()
         if not name:
             QMessageBox.warning(self, "警告", f"请输入{self.name_label}")
             return
         output_quantity = self.quantity_spin.value()
-        requirements = []
-        for i in range(self.requirements_list.count()):
-            text = self.requirements_list.item(i).text()
-            if text.startswith('半成品:'):
-                n = text.split(':', 1)[1].split('x')[0].strip()
-                item = self.db_manager.get_material_by_name(n)
-                if not item:
-                    QMessageBox.warning(self, "警告", f"找不到半成品: {n}")
-                    return
-                quantity = 1.0
-                if 'x' in text:
-                    try:
-                        quantity = float(text.split('x')[-1].strip())
-                    except Exception:
-                        pass
-                requirements.append({'type': 'material', 'id': item['id'], 'name': n, 'quantity': quantity})
-            elif text.startswith('原材料:'):
-                n = text.split(':', 1)[1].split('x')[0].strip()
-                item = self.db_manager.get_base_material_by_name(n)
-                if not item:
-                    QMessageBox.warning(self, "警告", f"找不到原材料: {n}")
-                    return
-                quantity = 1.0
-                if 'x' in text:
-                    try:
-                        quantity = float(text.split('x')[-1].strip())
-                    except Exception:
-                        pass
-                requirements.append({'type': 'base', 'id': item['id'], 'name': n, 'quantity': quantity})
+        # 需求直接取自平行列表，ID在添加时已解析
+        requirements = list(self._requirements)
         # 检查重名（仅新建时）
         if not self.edit_id:
             if self.name_label == "配方名称" and self.db_manager.get_product_by_name(name):
@@ -1082,6 +1099,8 @@ class RecipeEditDialog(QDialog):
             if self.name_label == "半成品名称" and self.db_manager.get_material_by_name(name):
                 QMessageBox.warning(self, "警告", f"已存在半成品: {name}")
                 return
+        # 需求行整批写入：ID在收集需求时已解析，不再按名称重查
+        req_rows = [(req['type'], req['id'], req['quantity']) for req in requirements]
         # 编辑模式：覆盖原有
         if self.edit_id:
             if self.name_label == "配方名称":
@@ -1090,9 +1109,8 @@ class RecipeEditDialog(QDialog):
             else:
                 self.db_manager.update_material(self.edit_id, name, output_quantity)
                 item_type = 'material'
-            # 先删除原有需求
-            self.db_manager.delete_recipe_requirements(item_type, self.edit_id)
-            item_id = self.edit_id
+            # 删旧插新在同一事务里原子完成
+            self.db_manager.replace_recipe_requirements(item_type, self.edit_id, req_rows)
         else:
             # 新建
             if self.name_label == "配方名称":
@@ -1101,50 +1119,14 @@ class RecipeEditDialog(QDialog):
             else:
                 item_id = self.db_manager.add_material(name, output_quantity)
                 item_type = 'material'
-        # 添加配方需求
-        for req in requirements:
-            req_type = req['type']
-            req_name = req['name']
-            req_quantity = req['quantity']
-            if req_type == 'base':
-                material = self.db_manager.get_base_material_by_name(req_name)
-                if material:
-                    self.db_manager.add_recipe_requirement(item_type, item_id, 'base', material['id'], req_quantity)
-            elif req_type == 'material':
-                material = self.db_manager.get_material_by_name(req_name)
-                if material:
-                    self.db_manager.add_recipe_requirement(item_type, item_id, 'material', material['id'], req_quantity)
+            self.db_manager.add_recipe_requirements(
+                [(item_type, item_id) + row for row in req_rows])
         QMessageBox.information(self, "成功", f"已保存{self.name_label[:-2]}: {name}")
         self.accept()
     def open_cost_edit(self):
         dlg = MaterialCostEditDialog(self.db_manager, self)
         dlg.exec()
 
-class DataMigrator:
-    """数据迁移器"""
-    def __init__(self, db_manager):
-        self.db_manager = db_manager
-    
-    def migrate_all(self) -> Dict[str, Any]:
-        """迁移所有数据"""
-        try:
-            # 这里可以实现从JSON文件迁移数据的逻辑
-            # 目前返回一个示例结果
-            return {
-                'success': True,
-                'migrated_counts': {
-                    'base_materials': 0,
-                    'materials': 0,
-                    'products': 0
-                }
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'message': str(e)
-            }
-
-
 def resource_path(relative_path):
     if hasattr(sys, '_MEIPASS'):
         return os.path.join(sys._MEIPASS, relative_path)
@@ -1267,12 +1249,18 @@ class FFXIVCalculatorWindow(QMainWindow):
         
         self.db_manager = DatabaseManager()  # 默认用根目录
         self.calculator = BOMCalculator(self.db_manager)
-        self.csv_importer = CSVImporter(self.db_manager)
-        
+        self.csv_importer = CSVImporter(self.db_manager, self.calculator)
+
         self.selected_items = []  # 选中的配方列表
-        
+
         self.current_selected_item = None  # 初始化当前选中物品
-        
+
+        # 搜索防抖：连续按键只重启定时器，停顿150ms后才真正查库刷新列表
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(150)
+        self._search_timer.timeout.connect(self.refresh_item_list)
+
         self.init_ui()
         self.load_data()
     
@@ -1974,12 +1962,18 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
         # 过滤搜索结果
         if search_text:
             items = [item for item in items if search_text.lower() in item['name'].lower()]
-        # 更新表格
-        self.item_table.clear()
-        icon_size = self.item_table.iconSize().width()
-        for item in items:
-            icon_item = get_item_icon_item_for_list(item['name'], item_type=item_type, icon_size=icon_size)
-            self.item_table.addItem(icon_item)
+        # 批量填充期间停掉重绘和信号，整批只触发一次布局/绘制
+        self.item_table.setUpdatesEnabled(False)
+        self.item_table.blockSignals(True)
+        try:
+            self.item_table.clear()
+            icon_size = self.item_table.iconSize().width()
+            for item in items:
+                icon_item = get_item_icon_item_for_list(item['name'], item_type=item_type, icon_size=icon_size)
+                self.item_table.addItem(icon_item)
+        finally:
+            self.item_table.blockSignals(False)
+            self.item_table.setUpdatesEnabled(True)
     
     def refresh_recipe_list(self):
         """刷新配方列表，顺序为成品、半成品、原材料，且只显示数据库真实存在的数据"""
@@ -2044,21 +2038,28 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
                             })
                     except Exception as e:
                         debug_log(f"[refresh_recipe_list] base id异常: {base['id']}, {e}")
-            self.recipe_list_table.setRowCount(len(all_items))
-            self.recipe_list_table.setHorizontalHeaderItem(0, QTableWidgetItem(""))
-            icon_size = self.recipe_list_table.verticalHeader().defaultSectionSize()
-            for row, item in enumerate(all_items):
-                index_item = QTableWidgetItem(str(row + 1))
-                index_item.setTextAlignment(Qt.AlignCenter)
-                # 传入item['item_type']
-                icon_item = get_item_icon_item(item['name'], item_type=item.get('item_type'), icon_size=icon_size)
-                icon_item.setData(Qt.UserRole, {'type': item['item_type'], 'id': item['id']})
-                self.recipe_list_table.setItem(row, 1, icon_item)
-                self.recipe_list_table.setRowHeight(row, icon_size)
-                type_item = QTableWidgetItem(item['type'])
-                self.recipe_list_table.setItem(row, 2, type_item)
-                quantity_item = QTableWidgetItem(self.format_number(item['output_quantity']))
-                self.recipe_list_table.setItem(row, 3, quantity_item)
+            # 批量填充期间停掉重绘和信号，不让每个setItem都触发选中回调和重绘
+            self.recipe_list_table.setUpdatesEnabled(False)
+            self.recipe_list_table.blockSignals(True)
+            try:
+                self.recipe_list_table.setRowCount(len(all_items))
+                self.recipe_list_table.setHorizontalHeaderItem(0, QTableWidgetItem(""))
+                icon_size = self.recipe_list_table.verticalHeader().defaultSectionSize()
+                for row, item in enumerate(all_items):
+                    index_item = QTableWidgetItem(str(row + 1))
+                    index_item.setTextAlignment(Qt.AlignCenter)
+                    # 传入item['item_type']
+                    icon_item = get_item_icon_item(item['name'], item_type=item.get('item_type'), icon_size=icon_size)
+                    icon_item.setData(Qt.UserRole, {'type': item['item_type'], 'id': item['id']})
+                    self.recipe_list_table.setItem(row, 1, icon_item)
+                    self.recipe_list_table.setRowHeight(row, icon_size)
+                    type_item = QTableWidgetItem(item['type'])
+                    self.recipe_list_table.setItem(row, 2, type_item)
+                    quantity_item = QTableWidgetItem(self.format_number(item['output_quantity']))
+                    self.recipe_list_table.setItem(row, 3, quantity_item)
+            finally:
+                self.recipe_list_table.blockSignals(False)
+                self.recipe_list_table.setUpdatesEnabled(True)
             self.recipe_list_table.setVisible(True)
             self.filter_recipe_list()
             # 刷新后清空右侧详情
@@ -2121,26 +2122,29 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
                     continue
                 if not req_item:
                     continue
-                show_text = f"{type_text}: {req_item['name']} x{req['quantity']}"
-                initial_requirements.append(show_text)
+                initial_requirements.append({
+                    'type': req['ingredient_type'],
+                    'id': req['ingredient_id'],
+                    'name': req_item['name'],
+                    'quantity': req['quantity'],
+                    'text': f"{type_text}: {req_item['name']} x{req['quantity']}",
+                })
             # 弹窗
             dialog = RecipeEditDialog(self, self.db_manager, title=title, name_label=name_label, initial_name=initial_name, initial_quantity=initial_quantity, edit_id=item_id, edit_type=item_type)
-            # 填充需求列表
+            # 填充需求列表（平行数据列表和查重集合同步填充）
             dialog.requirements_list.clear()
-            for text in initial_requirements:
-                if text.startswith("原材料:"):
-                    real_name = text.split(":", 1)[1].split('x')[0].strip()
-                    icon_path = get_icon_path(real_name, 'base')
-                elif text.startswith("半成品:"):
-                    real_name = text.split(":", 1)[1].split('x')[0].strip()
-                    icon_path = get_icon_path(real_name, 'material')
-                else:
-                    real_name = text
-                    icon_path = get_icon_path(real_name)
+            dialog._requirements.clear()
+            dialog._requirement_names.clear()
+            for req in initial_requirements:
+                text = req.pop('text')
+                icon_type = 'base' if req['type'] == 'base' else 'material'
+                icon_path = get_icon_path(req['name'], icon_type)
                 list_item = QListWidgetItem(text)
                 if icon_path:
                     list_item.setIcon(QIcon(icon_path))
                 dialog.requirements_list.addItem(list_item)
+                dialog._requirements.append(req)
+                dialog._requirement_names.add(text.split('x')[0].strip())
             if dialog.exec() == QDialog.Accepted:
                 self.refresh_data_models()
                 self.refresh_recipe_list()
@@ -2263,8 +2267,8 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
 
     
     def on_search_changed(self):
-        """搜索文本改变"""
-        self.refresh_item_list()
+        """搜索文本改变，重启防抖定时器，超时后才刷新"""
+        self._search_timer.start()
     
     def calculate_requirements(self):
         from loguru import logger
@@ -2288,9 +2292,9 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
             return
         # 恢复计算主逻辑
         self.calculation_worker = CalculationWorker(self.calculator, items)
-        self.calculation_worker.finished.connect(self.on_calculation_finished)
-        self.calculation_worker.error.connect(self.on_calculation_error)
-        self.calculation_worker.start()
+        self.calculation_worker.signals.finished.connect(self.on_calculation_finished)
+        self.calculation_worker.signals.error.connect(self.on_calculation_error)
+        QThreadPool.globalInstance().start(self.calculation_worker)
         self.calculate_button.setEnabled(False)
         self.calculate_button.setText("计算中...")
 
@@ -2674,10 +2678,10 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
             self.show_message("文件不存在", "error")
             return
         self.import_worker = ImportWorker(self.csv_importer, file_path)
-        self.import_worker.finished.connect(self.on_import_finished)
-        self.import_worker.error.connect(self.on_import_error)
-        self.import_worker.progress.connect(self.on_import_progress)
-        self.import_worker.start()
+        self.import_worker.signals.finished.connect(self.on_import_finished)
+        self.import_worker.signals.error.connect(self.on_import_error)
+        self.import_worker.signals.progress.connect(self.on_import_progress)
+        QThreadPool.globalInstance().start(self.import_worker)
         # 不再显示进度条
 
     def on_import_progress(self, message: str):
@@ -2717,19 +2721,22 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
         
         if reply == QMessageBox.Yes:
             try:
+                # 迁移是低频入口，迁移器连同loguru等依赖用到时才导入
+                from core.data_migrator import DataMigrator
                 migrator = DataMigrator(self.db_manager)
-                result = migrator.migrate_all()
-                
-                if result['success']:
-                    counts = result['migrated_counts']
-                    message = f"迁移成功！原材料: {counts['base_materials']}, 半成品: {counts['materials']}, 成品: {counts['products']}"
+                if migrator.migrate_all():
+                    # 迁移器自己管理连接和提交，版本号没走_write，手动失效计算缓存
+                    self.calculator.invalidate_cache()
+                    stats = self.db_manager.get_data_statistics()
+                    message = (f"迁移成功！原材料: {stats['base_materials']}, "
+                               f"半成品: {stats['materials']}, 成品: {stats['products']}")
                     self.show_message(message, "success")
                 else:
-                    self.show_message(f"迁移失败: {result['message']}", "error")
-                
+                    self.show_message("迁移失败，请查看日志", "error")
+
                 self.refresh_recipe_list()
                 self.refresh_item_list()
-                
+
             except Exception as e:
                 self.show_message(f"迁移失败: {str(e)}", "error")
     
@@ -2831,19 +2838,19 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
             
             # 创建导出工作线程
             self.export_worker = ExportWorker(self.db_manager, self.calculator, file_path)
-            self.export_worker.progress.connect(self.on_export_progress)
-            self.export_worker.finished.connect(self.on_export_finished)
-            self.export_worker.error.connect(self.on_export_error)
-            
-            # 启动导出线程
-            self.export_worker.start()
+            self.export_worker.signals.progress.connect(self.on_export_progress)
+            self.export_worker.signals.finished.connect(self.on_export_finished)
+            self.export_worker.signals.error.connect(self.on_export_error)
+
+            # 提交到全局线程池
+            QThreadPool.globalInstance().start(self.export_worker)
             
         except Exception as e:
             QMessageBox.critical(self, "导出失败", f"启动导出失败: {str(e)}")
     
     def on_export_cancelled(self, button):
         """取消导出"""
-        if hasattr(self, 'export_worker') and self.export_worker.isRunning():
+        if hasattr(self, 'export_worker'):
             self.export_worker.cancel()
             self.progress_dialog.setText("正在取消导出...")
     
@@ -3184,8 +3191,32 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
         """导出配方到CSV文件（包含原材料）"""
         import csv
 
+        # 名称映射整表预载一次，循环里成分名只剩字典查找，不再逐成分回库
+        base_names = {row['id']: row['name']
+                      for row in self.db_manager.get_base_materials_brief()}
+        material_names = {row['id']: row['name']
+                          for row in self.db_manager.get_materials_brief()}
+
+        def format_requirements(requirements):
+            all_reqs = []
+            for req in requirements:
+                if req['ingredient_type'] == 'base':
+                    name = base_names.get(req['ingredient_id'])
+                    prefix = ''
+                else:
+                    name = material_names.get(req['ingredient_id'])
+                    prefix = '[m]'  # 为半成品添加[m]标记
+                if name is None:
+                    continue
+                quantity = int(req['quantity'])
+                if quantity == 1:
+                    all_reqs.append(f"{prefix}{name}")
+                else:
+                    all_reqs.append(f"{prefix}{name}({quantity})")
+            return ' '.join(all_reqs)
+
         recipes = []
-        
+
         # 导出原材料
         base_materials = self.db_manager.get_base_materials()
         for base in base_materials:
@@ -3194,68 +3225,27 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
                 '物品类型': '原材料',
                 '所需材料': ''
             })
-            
-        # 导出半成品
-        materials = self.db_manager.get_materials()
-        for material in materials:
-            requirements = self.db_manager.get_recipe_requirements('material', material['id'])
-            all_reqs = []
-            for req in requirements:
-                if req['ingredient_type'] == 'base':
-                    ingredient = self.db_manager.get_base_material_by_id(req['ingredient_id'])
-                    if ingredient:
-                        quantity = int(req['quantity'])
-                        if quantity == 1:
-                            all_reqs.append(ingredient['name'])
-                        else:
-                            all_reqs.append(f"{ingredient['name']}({quantity})")
-                else:
-                    ingredient = self.db_manager.get_material_by_id(req['ingredient_id'])
-                    if ingredient:
-                        quantity = int(req['quantity'])
-                        # 为半成品添加[m]标记
-                        if quantity == 1:
-                            all_reqs.append(f"[m]{ingredient['name']}")
-                        else:
-                            all_reqs.append(f"[m]{ingredient['name']}({quantity})")
-            recipes.append({
-                '物品名称': material['name'],
-                '物品类型': '半成品',
-                '所需材料': ' '.join(all_reqs) if all_reqs else ''
-            })
 
-        # 导出成品
-        products = self.db_manager.get_products()
-        for product in products:
-            requirements = self.db_manager.get_recipe_requirements('product', product['id'])
-            all_reqs = []
-            for req in requirements:
-                if req['ingredient_type'] == 'base':
-                    ingredient = self.db_manager.get_base_material_by_id(req['ingredient_id'])
-                    if ingredient:
-                        quantity = int(req['quantity'])
-                        if quantity == 1:
-                            all_reqs.append(ingredient['name'])
-                        else:
-                            all_reqs.append(f"{ingredient['name']}({quantity})")
-                else:
-                    ingredient = self.db_manager.get_material_by_id(req['ingredient_id'])
-                    if ingredient:
-                        quantity = int(req['quantity'])
-                        # 为半成品添加[m]标记
-                        if quantity == 1:
-                            all_reqs.append(f"[m]{ingredient['name']}")
-                        else:
-                            all_reqs.append(f"[m]{ingredient['name']}({quantity})")
-            recipes.append({
-                '物品名称': product['name'],
-                '物品类型': '成品',
-                '所需材料': ' '.join(all_reqs) if all_reqs else ''
-            })
+        # 导出半成品/成品：需求行按类型各一条查询取回，再按recipe_id分组
+        # 代替逐配方get_recipe_requirements的N+1往返
+        for recipe_type, type_label, items in (
+            ('material', '半成品', self.db_manager.get_materials()),
+            ('product', '成品', self.db_manager.get_products()),
+        ):
+            reqs_by_recipe = {}
+            for row in self.db_manager.get_all_recipe_requirements(recipe_type):
+                reqs_by_recipe.setdefault(row['recipe_id'], []).append(row)
+            for item in items:
+                recipes.append({
+                    '物品名称': item['name'],
+                    '物品类型': type_label,
+                    '所需材料': format_requirements(reqs_by_recipe.get(item['id'], ()))
+                })
 
         # 写入CSV文件
         try:
-            with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
+            with open(file_path, 'w', newline='', encoding='utf-8-sig',
+                      buffering=1024 * 1024) as f:
                 fieldnames = ['物品名称', '物品类型', '所需材料']
                 writer = csv.DictWriter(f, fieldnames=fieldnames)
                 writer.writeheader()
@@ -3489,9 +3479,9 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
     def refresh_data_stats(self):
         """刷新数据统计"""
         try:
-            base_materials = self.db_manager.get_base_materials()
-            materials = self.db_manager.get_materials()
-            products = self.db_manager.get_products()
+            base_materials = self.db_manager.get_base_materials_brief()
+            materials = self.db_manager.get_materials_brief()
+            products = self.db_manager.get_products_brief()
             
             stats_text = f"数据统计:\n"
             stats_text += f"• 原材料: {len(base_materials)} 种\n"
@@ -3509,14 +3499,14 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
             issues = []
             
             # 检查半成品配方
-            materials = self.db_manager.get_materials()
+            materials = self.db_manager.get_materials_brief()
             for material in materials:
                 requirements = self.db_manager.get_recipe_requirements('material', material['id'])
                 if not requirements:
                     issues.append(f"半成品 '{material['name']}' 缺少配方需求")
             
             # 检查成品配方
-            products = self.db_manager.get_products()
+            products = self.db_manager.get_products_brief()
             for product in products:
                 requirements = self.db_manager.get_recipe_requirements('product', product['id'])
                 if not requirements:
@@ -3579,9 +3569,11 @@ QTreeView::branch { background: transparent; border-left: 3px solid #444; }
 
     def refresh_data_models(self):
         # 重新加载数据库和计算器，保证数据同步
+        # 先关掉旧管理器的主线程连接，不等GC回收
+        self.db_manager.close()
         self.db_manager = DatabaseManager()
         self.calculator = BOMCalculator(self.db_manager)
-        self.csv_importer = CSVImporter(self.db_manager)
+        self.csv_importer = CSVImporter(self.db_manager, self.calculator)
 
     def eventFilter(self, obj, event):
         if hasattr(self, 'selected_table') and self.selected_table is not None: